@@ -0,0 +1,163 @@
+"""
+Benchmarks for the LECS parsing and flux pipeline on synthetic raw data.
+
+Times the parse and alignment paths (legacy, lowMemory and clock), SlineParser and spectralECflux at
+1 day, 1 week and 1 month of 16 Hz data and records the peak traced memory of each stage.
+The synthetic raw files are cached in --data-dir so they are only generated once.
+
+usage:
+    python benchmarks/bench_pipeline.py --sizes day week month --json bench.json
+
+Note: the legacy timeAlignmentV2 scales with the square of the record length (about 20 s for an hour),
+so the legacy stages only run up to --legacy-max (an hour by default).
+"""
+
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from LECS_tools import _internalParserFuncsV2 as parser
+from LECS_tools.flux import spectralECflux
+from LECS_tools.synthetic import writeRawFile
+
+SIZES = {
+    'hour': 3600,
+    'day': 24 * 3600,
+    'week': 7 * 24 * 3600,
+    'month': 30 * 24 * 3600,
+}
+
+STAGES = ('parseDatabaseLines', 'parseLowMemory', 'parseClock', 'SlineParser',
+          'timeAlignmentV2', 'alignTimeIndex', 'reconstructSampleClock', 'spectralECflux')
+LEGACY_STAGES = ('parseDatabaseLines', 'timeAlignmentV2')
+
+
+def rawFile(dataDir, size, seed=0):
+    """
+    path of the cached synthetic raw file for a size, generating it if needed
+    """
+    path = os.path.join(dataDir, 'lecs_synthetic_%s.txt' % size)
+    if not os.path.exists(path):
+        print('generating %s of synthetic data -> %s' % (size, path), flush=True)
+        writeRawFile(path + '.tmp', durationSeconds=SIZES[size], seed=seed,
+                     corruptFraction=0.001, dropFraction=0.001, junkFraction=0.001)
+        os.replace(path + '.tmp', path)
+    return path
+
+
+def measure(func, *args, trackMemory=True, **kwargs):
+    """
+    run func once for wall time and (optionally) once more under tracemalloc for the peak memory
+
+    Returns:
+        tuple: result, seconds, peak bytes (None if not tracked)
+    """
+    gc.collect()
+    t0 = time.perf_counter()
+    result = func(*args, **kwargs)
+    seconds = time.perf_counter() - t0
+
+    peak = None
+    if trackMemory:
+        del result
+        gc.collect()
+        tracemalloc.start()
+        result = func(*args, **kwargs)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result, seconds, peak
+
+
+def splitLines(lines):
+    """
+    the (index, line) lists parseDatabaseLines builds before parsing
+    """
+    dlines, slines = [], []
+    for idx, l in enumerate(lines):
+        l = l.strip()
+        if 'D:' in l:
+            dlines.append((idx, l))
+        elif 'S:' in l:
+            slines.append((idx, l))
+    return dlines, slines
+
+
+def runSize(size, dataDir, stages, trackMemory=True, legacyMax='hour'):
+    """
+    run the benchmark stages for one record size (the legacy stages only up to legacyMax)
+    """
+    if SIZES[size] > SIZES[legacyMax]:
+        skipped = [stage for stage in stages if stage in LEGACY_STAGES]
+        if skipped:
+            print('%-6s skipping %s (longer than --legacy-max %s)' % (size, ', '.join(skipped), legacyMax), flush=True)
+        stages = [stage for stage in stages if stage not in LEGACY_STAGES]
+    with open(rawFile(dataDir, size)) as fid:
+        lines = fid.read().split('\n')
+    dlines, slines = splitLines(lines)
+    results = []
+
+    def record(stage, nRows, seconds, peak):
+        results.append(dict(size=size, stage=stage, rows=nRows, seconds=seconds,
+                            rowsPerSecond=nRows / seconds if seconds else None, peakBytes=peak))
+        print('%-6s %-22s %10d rows %10.3f s %12s rows/s %10s MB' % (
+            size, stage, nRows, seconds,
+            '%.0f' % (nRows / seconds) if seconds else '-',
+            '%.1f' % (peak / 1e6) if peak is not None else '-'), flush=True)
+
+    for stage, kwargs in (('parseDatabaseLines', {}), ('parseLowMemory', {'lowMemory': True}),
+                          ('parseClock', {'alignMethod': 'clock'})):
+        if stage in stages:
+            _, seconds, peak = measure(parser.parseDatabaseLines, lines, trackMemory=trackMemory, **kwargs)
+            record(stage, len(lines), seconds, peak)
+
+    sFrame, seconds, peak = measure(parser.SlineParser, slines, trackMemory=trackMemory and 'SlineParser' in stages)
+    if 'SlineParser' in stages:
+        record('SlineParser', len(slines), seconds, peak)
+
+    alignStages = [stage for stage in ('timeAlignmentV2', 'alignTimeIndex', 'reconstructSampleClock') if stage in stages]
+    if alignStages:
+        dFrame = parser.DlineParser(dlines, chunkSize=65536)
+        for stage in alignStages:
+            _, seconds, peak = measure(getattr(parser, stage), dFrame, sFrame, trackMemory=trackMemory)
+            record(stage, len(dFrame), seconds, peak)
+        del dFrame
+
+    if 'spectralECflux' in stages:
+        parsed, _ = parser.parseDatabaseLines(lines, lowMemory=True)
+        _, seconds, peak = measure(spectralECflux, parsed, 'w', 'temp', trackMemory=trackMemory)
+        record('spectralECflux', len(parsed), seconds, peak)
+
+    return results
+
+
+def main(argv=None):
+    args = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    args.add_argument('--sizes', nargs='+', default=['day', 'week', 'month'], choices=list(SIZES))
+    args.add_argument('--stages', nargs='+', default=list(STAGES), choices=list(STAGES))
+    args.add_argument('--legacy-max', default='hour', choices=list(SIZES),
+                      help='largest size the legacy (quadratic) parseDatabaseLines/timeAlignmentV2 stages run at')
+    args.add_argument('--data-dir', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data'))
+    args.add_argument('--no-memory', action='store_true', help='skip the (slower) tracemalloc peak memory runs')
+    args.add_argument('--json', default=None, help='write the results to this json file')
+    args = args.parse_args(argv)
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    results = []
+    for size in args.sizes:
+        results.extend(runSize(size, args.data_dir, args.stages, trackMemory=not args.no_memory,
+                               legacyMax=args.legacy_max))
+
+    if args.json is not None:
+        with open(args.json, 'w') as fid:
+            json.dump(results, fid, indent=1)
+    return results
+
+
+if __name__ == '__main__':
+    main()
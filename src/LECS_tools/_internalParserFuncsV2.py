@@ -10,8 +10,10 @@ Internal parsing functions for the parser.
 import numpy as np
 import pandas as pd
 import datetime as dt
+from array import array
 from urllib.request import urlopen
 from tqdm import tqdm as bar
+from .calibrations import polyval_into, do_percent_into
 
 ### params for parsing
 # RINKO_CALS_temp - for the serial number 
@@ -29,6 +31,8 @@ E_o2 = 4.000000e-03
 F_o2 = 4.440000e-05
 G_o2 = 0.000000e+00
 H_o2 = 1.000000e+00
+doCalCoeffs = dict(A_o2=A_o2, B_o2=B_o2, C_o2=C_o2, D_o2=D_o2,
+                   E_o2=E_o2, F_o2=F_o2, G_o2=G_o2, H_o2=H_o2)
 
 
 ## Dline variable names from the raw LECS data
@@ -118,16 +122,23 @@ def loadLECSdata(url='https://gems.whoi.edu/LECSrawdata/'):
 def DlineParser(dlinesList, 
                 correctNumEntries = 16,
                 names = namesDline,
+                dtype = np.float64,
+                chunkSize = None,
                 ):
     """
     This function parses the D lines (Data lines) from the LECS raw data and returns a pandas dataframe.
     It also applies the calibration coefficients to the data.
     A follow up step is required to align the data with the S lines (status lines) which contain the timestamps.
     This is done in the function alignTimeWithData.
+    The calibrations are evaluated in place in the dataframe buffer (see calibrations.polyval_into / do_percent_into)
+    so no full length temporaries are created.
     Args:
         dlinesList (list): List of D-line strings
         correctNumEntries (int, optional): number of data points in each line. Defaults to 16.
         names (_type_, optional): names of the data columns. Defaults to namesDline.
+        dtype (np.dtype, optional): dtype of the data columns, np.float32 halves the memory. Defaults to np.float64.
+        chunkSize (int, optional): convert the text and evaluate the calibrations in blocks of this many lines,
+            which bounds the temporary string arrays. Defaults to None (one block).
 
     Returns:
         _type_: _description_
@@ -135,12 +146,34 @@ def DlineParser(dlinesList,
     
     # dline parser data entries
     
-    # first filter out bad lines (missing value lines)
-    df = []
+    # filter out bad lines (missing value lines) and convert the rest block by block straight into
+    # one column-major buffer with room for DO_percent, so every column is contiguous and the calibrations
+    # can be written in place. Only one block of split strings is held at a time.
     sep = 'D:'
-    counts = []
-    Dlines = []
-    idxArray = []
+    names = list(names)
+    nMax = len(dlinesList)
+    DlineArray = np.empty((nMax, len(names) + 1), dtype=dtype, order='F')
+    idxArray = np.empty(nMax, dtype=np.int64)
+    step = max(nMax, 1) if chunkSize is None else max(int(chunkSize), 1)
+    nRows = 0 # rows converted so far
+    block = []
+    blockIdx = []
+
+    def convert(block, blockIdx, nRows):
+        try:
+            DlineArray[nRows:nRows + len(block), :len(names)] = np.vstack([t.split(',') for t in block])
+            idxArray[nRows:nRows + len(block)] = blockIdx
+            return nRows + len(block)
+        except ValueError: # a field that isn't a number (e.g. empty), convert line by line and drop those
+            for t, idx in zip(block, blockIdx):
+                try:
+                    DlineArray[nRows, :len(names)] = t.split(',')
+                except ValueError:
+                    continue
+                idxArray[nRows] = idx
+                nRows += 1
+            return nRows
+
     for idx, line in dlinesList:
         
         
@@ -150,28 +183,27 @@ def DlineParser(dlinesList,
         # print(t)
         # print(len(t.split(',')))
         
-        counts.append(len(t.split(',')))
-        if len(t.split(',')) ==16:
-            Dlines.append(t.split(','))
-            idxArray.append(idx)
-        
-    idxArray = np.hstack(idxArray)
-    # now stack the data into a dataframe
-    DlineArray = np.vstack(Dlines)
-    DlineDataFrame = pd.DataFrame(DlineArray, 
-                                  columns = names,dtype=float)
+        if t.count(',') + 1 == correctNumEntries:
+            block.append(t) # split when the block is converted
+            blockIdx.append(idx)
+            if len(block) == step:
+                nRows = convert(block, blockIdx, nRows)
+                block, blockIdx = [], []
+    if block:
+        nRows = convert(block, blockIdx, nRows)
+    del block, blockIdx
+    DlineArray, idxArray = DlineArray[:nRows], idxArray[:nRows] # (columns stay contiguous)
+    col = {name: i for i, name in enumerate(names)}
     
     ## apply corrections
-    DlineDataFrame['u'] = DlineDataFrame['u'] * 0.001
-    DlineDataFrame['v'] = DlineDataFrame['v'] * 0.001
-    DlineDataFrame['w'] = DlineDataFrame['w'] * 0.001
-    Volt = DlineDataFrame['temp']
-    voltO2 = DlineDataFrame['DO']
-    DlineDataFrame['temp'] = A+B*Volt+C*Volt**2+D*Volt**3
-    Pprime = ((A_o2) /( 1 + D_o2*(DlineDataFrame['temp'] -25))) + ((B_o2) / ((voltO2 - F_o2)*(1+D_o2*(DlineDataFrame['temp'] -25)) + C_o2 + F_o2))
-    DlineDataFrame['DO_percent'] = G_o2 + H_o2 * Pprime
+    for name in ('u', 'v', 'w'):
+        DlineArray[:, col[name]] *= 0.001
+    Volt = DlineArray[:, col['temp']]
+    voltO2 = DlineArray[:, col['DO']]
+    polyval_into(Volt, (A, B, C, D), out=Volt, chunkSize=chunkSize)
+    do_percent_into(voltO2, Volt, out=DlineArray[:, -1], cal_coeffs=doCalCoeffs, chunkSize=chunkSize)
     
-    DlineDataFrame.set_index(idxArray,inplace=True)
+    DlineDataFrame = pd.DataFrame(DlineArray, columns=names + ['DO_percent'], index=idxArray, copy=False)
     # print(DlineDataFrame.head())
     
     return DlineDataFrame
@@ -189,6 +221,8 @@ def SlineParser(slinesList,timeOnly=True):
 
     Args:
         slinesList (_type_): _description_
+        timeOnly (bool, optional): False decodes all the lines at once with the vectorized telemetry decoder
+            (see SlineTelemetryParser). Defaults to True.
     """
     
     # first parse all the slines
@@ -231,15 +265,207 @@ def SlineParser(slinesList,timeOnly=True):
 
         return SlineDataFrame 
     
-    else: # this is really unused junk right now
-        for idx, line in slinesList:
-            t = line.split(sep, 1)[1] # split the line by the separator
-            SlineArray.append(t.split(',')[:6]) # split the line by commas including only the time
-        return SlineArray
+    else:
+        return SlineTelemetryParser(slinesList)
+
+
+slineTelemetryTypes = {
+    'batteryVoltage': np.float32,
+    'soundSpeed': np.float32,
+    'heading': np.float32,
+    'pitch': np.float32,
+    'roll': np.float32,
+    'temp2': np.float32,
+}
+
+
+def SlineTelemetryParser(slinesList, lowYear=2022, highYear=2024):
+    """
+    Decode all the S line fields at once into typed columns: the system and ADV clock times and the
+    telemetry (battery voltage, sound speed, heading, pitch, roll, temp2).
+    Malformed fields become NaN/NaT instead of failing the whole batch, lines with an ADV date outside
+    lowYear-highYear or an impossible month/day are dropped like in the timeOnly parser and clocks
+    in the future are set to NaT.
+
+    Args:
+        slinesList (list): list of (index, line) tuples of S lines
+        lowYear (int, optional): first valid ADV year. Defaults to 2022.
+        highYear (int, optional): last valid ADV year. Defaults to 2024.
+
+    Returns:
+        pandas dataframe: time, timeADV and the slineTelemetryTypes columns (plus the raw clock fields as Int16),
+            indexed by the line index
+    """
+    idxArray = np.array([idx for idx, _ in slinesList], dtype=np.int64)
+    text = pd.Series([line for _, line in slinesList], index=idxArray, dtype=object)
+    fields = text.str.partition('S:')[2].str.split(',', n=len(slineKey), expand=True)
+    fields = fields.reindex(columns=range(len(slineKey)))
+    fields.columns = slineKey
+    values = fields.apply(pd.to_numeric, errors='coerce')
+    values['yearVSD'] = values['yearVSD'] + 2000
+
+    keep = (values['yearVSD'] >= lowYear) & (values['yearVSD'] <= highYear) & \
+           (values['monthVSD'] <= 12) & (values['dayVSD'] <= 31)
+    values = values[keep]
+
+    now = pd.Timestamp('now')
+    time = pd.to_datetime(values[['year', 'month', 'day', 'hour', 'minute', 'second']], errors='coerce')
+    timeADV = pd.to_datetime(values[['yearVSD', 'monthVSD', 'dayVSD', 'hourVSD', 'minuteVSD', 'secondVSD']]
+                             .set_axis(['year', 'month', 'day', 'hour', 'minute', 'second'], axis=1), errors='coerce')
+
+    SlineDataFrame = pd.DataFrame(index=values.index)
+    for name in slineKey:
+        if name in slineTelemetryTypes:
+            SlineDataFrame[name] = values[name].astype(slineTelemetryTypes[name])
+        else:
+            field = values[name].round()
+            SlineDataFrame[name] = field.where((field >= -2**15) & (field < 2**15)).astype('Int16') # out of range -> NA
+    SlineDataFrame['time'] = time.where(time < now)
+    SlineDataFrame['timeADV'] = timeADV.where(timeADV < now)
+    return SlineDataFrame
         
 
     
 
+gpsTypes = {
+    'time': 'datetime64[ns]',
+    'lat': np.float64,
+    'lon': np.float64,
+    'sentence': str,
+    'fixQuality': np.float64,
+    'nSatellites': np.float64,
+    'hdop': np.float64,
+    'altitude': np.float64,
+    'speedKnots': np.float64,
+    'course': np.float64,
+    'checksumOK': bool,
+}
+
+
+def _nmeaDegrees(value, hemisphere):
+    """
+    convert NMEA ddmm.mmmm / dddmm.mmmm coordinates (Series of strings) to signed decimal degrees
+    """
+    x = pd.to_numeric(value, errors='coerce')
+    deg = np.floor(x / 100)
+    out = deg + (x - deg * 100) / 60
+    return out.where(~hemisphere.isin(['S', 'W']), -out)
+
+
+def GPSlineParser(gpsList, keepBadChecksums=False):
+    """
+    Bulk decode the $ (gps, NMEA) lines into a typed position/time dataframe.
+    The checksums are validated for all lines at once and RMC and GGA sentences are decoded
+    with vectorized string operations (GGA sentences take their date from the last RMC sentence).
+
+    Args:
+        gpsList (list): list of (index, line) tuples of $ lines
+        keepBadChecksums (bool, optional): keep lines that fail the checksum (flagged in checksumOK). Defaults to False.
+
+    Returns:
+        pandas dataframe: time, lat, lon, sentence, fixQuality, nSatellites, hdop, altitude, speedKnots, course,
+            checksumOK, indexed by the line index
+    """
+    if len(gpsList) == 0: # same columns and dtypes as with gps lines
+        return pd.DataFrame({name: pd.Series(dtype=dtype) for name, dtype in gpsTypes.items()},
+                            index=pd.Index([], dtype=np.int64))
+
+    idxArray = np.array([idx for idx, _ in gpsList])
+    lines = pd.Series([line for _, line in gpsList], index=idxArray)
+    sentence = lines.str.extract(r'\$([^*]*)(?:\*([0-9A-Fa-f]{2}))?', expand=True)
+    body = sentence[0].fillna('')
+    hexDigits = sentence[1].fillna('').str.encode('ascii').to_numpy().astype('S2').view(np.uint8).reshape(-1, 2)
+    nibbles = np.where(hexDigits <= ord('9'), hexDigits - ord('0'), (hexDigits | 0x20) - ord('a') + 10)
+    given = np.where(sentence[1].notna(), nibbles[:, 0].astype(int) * 16 + nibbles[:, 1], -1)
+
+    # xor all characters of every sentence body at once on a zero padded byte matrix
+    raw = body.str.encode('ascii', errors='replace').to_numpy().astype(bytes)
+    width = max(raw.dtype.itemsize, 1)
+    byteMatrix = raw.astype('S%d' % width).view(np.uint8).reshape(len(raw), width)
+    checksum = np.bitwise_xor.reduce(byteMatrix, axis=1)
+    checksumOK = checksum == given
+
+    fields = body.str.split(',', expand=True)
+    fields = fields.reindex(columns=range(12))
+    kind = fields[0].str[-3:]
+    isRMC = (kind == 'RMC').to_numpy()
+    isGGA = (kind == 'GGA').to_numpy()
+    keep = isRMC | isGGA
+    if not keepBadChecksums:
+        keep &= checksumOK
+
+    # field positions differ between the two sentences
+    latField = fields[3].where(isRMC, fields[2])
+    latHem = fields[4].where(isRMC, fields[3])
+    lonField = fields[5].where(isRMC, fields[4])
+    lonHem = fields[6].where(isRMC, fields[5])
+
+    hhmmss = pd.to_numeric(fields[1], errors='coerce')
+    secondOfDay = (np.floor(hhmmss / 10000) * 3600 + np.floor(hhmmss / 100 % 100) * 60 + hhmmss % 100)
+
+    # RMC has the date, GGA uses the date of the previous RMC fix (plus a day if it passed midnight since);
+    # GGA fixes before the first RMC take the date of the next one (minus a day if midnight came in between)
+    date = pd.to_datetime(fields[9].where(isRMC & checksumOK), format='%d%m%y', errors='coerce')
+    rmcSecond = secondOfDay.where(date.notna())
+    before = date.ffill().isna().to_numpy() # no RMC date yet
+    date = date.ffill().bfill()
+    rmcSecond = rmcSecond.ffill().bfill()
+    dayShift = np.where(before, -(isGGA & (secondOfDay > rmcSecond)).astype(int),
+                        (isGGA & (secondOfDay < rmcSecond)).astype(int))
+    date = date + pd.to_timedelta(dayShift, unit='D')
+    time = date + pd.to_timedelta(secondOfDay, unit='s')
+
+    GPSDataFrame = pd.DataFrame({
+        'time': time.astype('datetime64[ns]'),
+        'lat': _nmeaDegrees(latField, latHem),
+        'lon': _nmeaDegrees(lonField, lonHem),
+        'sentence': kind,
+        'fixQuality': pd.to_numeric(fields[6].where(isGGA), errors='coerce'),
+        'nSatellites': pd.to_numeric(fields[7].where(isGGA), errors='coerce'),
+        'hdop': pd.to_numeric(fields[8].where(isGGA), errors='coerce'),
+        'altitude': pd.to_numeric(fields[9].where(isGGA), errors='coerce'),
+        'speedKnots': pd.to_numeric(fields[7].where(isRMC), errors='coerce'),
+        'course': pd.to_numeric(fields[8].where(isRMC), errors='coerce'),
+        'checksumOK': checksumOK,
+    }, index=idxArray)
+
+    return GPSDataFrame[keep]
+
+
+def mergeGPS(data, gps, columns=('lat', 'lon'), tolerance='2s', direction='nearest'):
+    """
+    Merge gps positions onto the aligned D line data with a sorted as-of join on time
+
+    Args:
+        data (pandas dataframe): aligned data (output of parseDatabaseLines), sorted by time
+        gps (pandas dataframe): output of GPSlineParser
+        columns (tuple, optional): gps columns to add. Defaults to ('lat', 'lon').
+        tolerance (str, optional): largest time difference for a match, unmatched rows get NaN. Defaults to '2s'.
+        direction (str, optional): 'backward', 'forward' or 'nearest' (see pandas.merge_asof). Defaults to 'nearest'.
+
+    Returns:
+        pandas dataframe: data with the gps columns added
+    """
+    columns = list(columns)
+    gps = gps[gps['time'].notna()].sort_values(by='time', kind='stable')
+    right = pd.DataFrame({'time': gps['time'].to_numpy(dtype='datetime64[ns]')})
+    for col in columns:
+        right[col] = gps[col].to_numpy()
+
+    time = pd.to_datetime(data['time']).to_numpy(dtype='datetime64[ns]')
+    order = np.argsort(time, kind='stable') # already sorted for parseDatabaseLines output
+    order = order[~np.isnat(time[order])]
+    merged = pd.merge_asof(pd.DataFrame({'time': time[order]}), right, on='time',
+                           tolerance=pd.Timedelta(tolerance), direction=direction)
+
+    dataRev = data.copy()
+    for col in columns:
+        values = np.full(len(data), np.nan, dtype=float if merged[col].dtype.kind in 'biuf' else object)
+        values[order] = merged[col].to_numpy()
+        dataRev[col] = values
+    return dataRev
+
+
 def alignTimeWithData(data, sLines, useCount2sort=False,
                       samplingFrequencyHz=16,
                       lowTimeCutoff='2022', highTimeCutoff='now'):
@@ -416,6 +642,220 @@ def timeAlignmentV2(data, sLines,
     return dataRev.sort_values(by='time')
 
 
+def alignTimeIndex(data, sLines,
+                   samplingFrequencyHz=16,
+                   lowTimeCutoff='2022', highTimeCutoff='now'):
+    """
+    Vectorized, copy free equivalent of timeAlignmentV2.
+    Instead of copying the data, writing NaT across whole rows and re-sorting, it returns the time of
+    every row and the sort order of the rows with a valid time, so the caller builds the sorted output once.
+
+    Within each S line segment timeAlignmentV2 keeps count0 as the running minimum of the counts (< 256)
+    and steps the time by one sample plus any count increase over count0, which is done here with
+    segmented cumulative min/sum over all the rows at once.
+
+    Args:
+        data (pandas dataframe): output of DlineParser
+        sLines (pandas dataframe): output of SlineParser
+        samplingFrequencyHz (int, optional): sampling frequency. Defaults to 16.
+        lowTimeCutoff (str, optional): earlier times are dropped. Defaults to '2022'.
+        highTimeCutoff (str, optional): later times are dropped. Defaults to 'now'.
+
+    Returns:
+        tuple: time (datetime64[ns] array aligned with the rows of data, NaT where there is no time),
+            order (row positions with a valid time, sorted by time)
+    """
+    step = pd.Timedelta(1/samplingFrequencyHz, unit='s').value
+    dIdx = data.index.to_numpy().astype(np.int64)
+    count = data['count'].to_numpy()
+    n = len(dIdx)
+    timeNs = np.full(n, np.iinfo(np.int64).min, dtype=np.int64) # NaT
+
+    sIdx = sLines.index.to_numpy().astype(np.int64)
+    sTime = pd.to_datetime(sLines['timeADV']).to_numpy(dtype='datetime64[ns]')
+    if len(sIdx) > 1 and n > 0:
+        # rows of each segment: the first line after the S line up to the line before the next S line
+        first = np.searchsorted(dIdx, sIdx[:-1] + 1)
+        stop = np.searchsorted(dIdx, sIdx[1:])
+        hasFirst = (first < n) & (dIdx[np.clip(first, 0, n - 1)] == sIdx[:-1] + 1) & ~np.isnat(sTime[:-1])
+        first, stop, anchor = first[hasFirst], stop[hasFirst], sTime[:-1][hasFirst].astype(np.int64)
+
+        segment = np.full(n, -1, dtype=np.int64)
+        lengths = stop - first
+        segment[np.repeat(first, lengths) + np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)] = \
+            np.repeat(np.arange(len(first)), lengths)
+        isFirst = np.zeros(n, dtype=bool)
+        isFirst[first] = True
+        valid = (segment >= 0) & ~isFirst & (count < 256) # counts >= 256 (or NaN) are bad data
+
+        # count0 = running minimum of the segment (starting from the first row's count)
+        rows = np.flatnonzero(valid | isFirst)
+        seg = segment[rows]
+        c = count[rows]
+        big = 2.0 * (np.nanmax(np.abs(c)) + 1) if len(c) else 1.0
+        shifted = np.where(np.isnan(c), np.inf, c) - seg * big
+        runMin = np.minimum.accumulate(shifted) + seg * big
+        prevMin = np.r_[np.inf, runMin[:-1]]
+        rowFirst = isFirst[rows]
+
+        # time step of every valid row, then a cumulative sum that restarts at each segment
+        inc = np.where(rowFirst, 0, step * (1 + np.maximum(c - prevMin, 0))).astype(np.int64)
+        cum = np.cumsum(inc)
+        segStart = cum[rowFirst] - inc[rowFirst]
+        newTime = anchor[seg] + cum - segStart[seg]
+        rolled = ~rowFirst & (c < prevMin) # count rolled over: this sample is one step past newTime
+        timeNs[rows] = newTime + np.where(rolled, step, 0)
+
+    time = timeNs.view('datetime64[ns]')
+    inRange = ~np.isnat(time) & (time <= np.datetime64(highTimeCutoff)) & (time >= np.datetime64(lowTimeCutoff))
+    time[~inRange] = np.datetime64('NaT')
+    order = np.flatnonzero(inRange)
+    order = order[np.argsort(time[order], kind='stable')]
+    return time, order
+
+
+def reconstructSampleClock(data, sLines,
+                           samplingFrequencyHz=16,
+                           blockSeconds=3600,
+                           turnTolerance=20,
+                           lowTimeCutoff='2022', highTimeCutoff='now'):
+    """
+    Gap aware timestamps from the sample counter, fitted to the ADV clock of the S lines.
+
+    The 8 bit count is unwrapped into a continuous sample index ((count difference) mod 256 between
+    consecutive good rows), so every dropped sample shows up as a jump in the index. Rows whose count
+    doesn't fit between their neighbours (corrupted counts) and counts outside 0-255 are dropped.
+    Whole missing turns of the counter (256 or more lost samples) are restored from the S line times,
+    then a straight line (time = offset + period x sample index) is fitted to the timeADV anchors of every
+    blockSeconds block, which corrects the drift of the sample clock between anchors.
+    Everything is vectorized (bincount sums for the fits), so months of data take seconds.
+
+    Args:
+        data (pandas dataframe): output of DlineParser
+        sLines (pandas dataframe): output of SlineParser
+        samplingFrequencyHz (int, optional): nominal sampling frequency. Defaults to 16.
+        blockSeconds (int, optional): length of the blocks with their own clock fit. Defaults to 3600.
+        turnTolerance (int, optional): samples an anchor interval may be off a whole number of counter turns
+            (the S line time has one second resolution) before it is taken as a counter reset. Defaults to 20.
+        lowTimeCutoff (str, optional): earlier times are dropped. Defaults to '2022'.
+        highTimeCutoff (str, optional): later times are dropped. Defaults to 'now'.
+
+    Returns:
+        tuple: time (datetime64[ns] array aligned with the rows of data, NaT where there is no time),
+            order (row positions with a valid time, sorted by time),
+            droppedBefore (int array aligned with the rows of data, samples missing right before each row)
+    """
+    nominalStep = 1e9 / samplingFrequencyHz
+    dIdx = data.index.to_numpy().astype(np.int64)
+    count = data['count'].to_numpy(dtype=float)
+    n = len(dIdx)
+    timeNs = np.full(n, np.iinfo(np.int64).min, dtype=np.int64) # NaT
+    droppedBefore = np.zeros(n, dtype=np.int64)
+
+    # good counts, then drop the ones that need an extra turn of the counter to fit between their neighbours
+    good = np.flatnonzero(np.isfinite(count) & (count >= 0) & (count < 256) & (count == np.round(count)))
+    for _ in range(2):
+        c = count[good].astype(np.int64)
+        if len(c) < 3:
+            break
+        dPrev = (c[1:-1] - c[:-2]) % 256
+        dNext = (c[2:] - c[1:-1]) % 256
+        outlier = np.r_[False, dPrev + dNext > 256, False]
+        if not outlier.any():
+            break
+        good = good[~outlier]
+
+    sIdx = sLines.index.to_numpy().astype(np.int64)
+    sTime = pd.to_datetime(sLines['timeADV']).to_numpy(dtype='datetime64[ns]')
+    sIdx, sTime = sIdx[~np.isnat(sTime)], sTime[~np.isnat(sTime)].astype(np.int64)
+    if len(good) == 0 or len(sIdx) == 0:
+        return timeNs.view('datetime64[ns]'), np.array([], dtype=np.int64), droppedBefore
+
+    # unwrap: samples since the previous good row (a repeated count is a full turn)
+    c = count[good].astype(np.int64)
+    step = np.r_[0, (c[1:] - c[:-1]) % 256]
+    step[1:][step[1:] == 0] = 256
+
+    # anchors: the first good row after each S line (before the next one) takes the S line's timeADV
+    anchorRow = np.searchsorted(dIdx[good], sIdx, side='right')
+    nextS = np.r_[sIdx[1:], np.iinfo(np.int64).max]
+    hasRow = anchorRow < len(good)
+    hasRow[hasRow] = dIdx[good][anchorRow[hasRow]] < nextS[hasRow]
+    anchorRow, anchorNs = anchorRow[hasRow], sTime[hasRow]
+    if len(anchorRow) == 0: # no S line is followed by a good row
+        return timeNs.view('datetime64[ns]'), np.array([], dtype=np.int64), droppedBefore
+
+    # full turns of the counter lost between two anchors: the ADV clock says how many samples should be there.
+    # An interval that isn't a whole number of turns (within a second of samples) means the counter was reset
+    # (e.g. the instrument rebooted in a logging gap); the clock fit is split there. A single anchor that is
+    # inconsistent with both neighbours while they agree with each other is a bad S line time and is dropped.
+    sample = np.cumsum(step)
+
+    def intervalTurns(a, b):
+        missing = (anchorNs[b] - anchorNs[a]) / nominalStep - (sample[anchorRow[b]] - sample[anchorRow[a]])
+        turns = np.round(missing / 256)
+        return turns, (turns >= 0) & (np.abs(missing - 256 * turns) <= turnTolerance)
+
+    if len(anchorRow) > 2:
+        j = np.arange(len(anchorRow) - 2)
+        okBefore, okAfter, okSkip = (intervalTurns(j, j + 1)[1], intervalTurns(j + 1, j + 2)[1],
+                                     intervalTurns(j, j + 2)[1])
+        badAnchor = np.r_[False, ~okBefore & ~okAfter & okSkip, False]
+        anchorRow, anchorNs = anchorRow[~badAnchor], anchorNs[~badAnchor]
+    breakBefore = np.zeros(len(anchorRow), dtype=bool) # anchor starts a new clock piece
+    if len(anchorRow) > 1:
+        j = np.arange(len(anchorRow) - 1)
+        turns, consistent = intervalTurns(j, j + 1)
+        np.add.at(step, anchorRow[1:][consistent], (256 * turns[consistent]).astype(np.int64))
+        breakBefore[1:] = ~consistent
+        sample = np.cumsum(step)
+
+    # one clock fit per block of anchors (a new block at every break and every blockSeconds), sums over
+    # centred values with bincount
+    piece = np.cumsum(breakBefore)
+    pieceStart = anchorNs[np.flatnonzero(np.r_[True, breakBefore[1:]])][piece]
+    timeBlock = (anchorNs - pieceStart) // (int(blockSeconds) * 10**9)
+    block = np.cumsum(np.r_[True, (piece[1:] != piece[:-1]) | (timeBlock[1:] != timeBlock[:-1])]) - 1
+    nBlocks = block.max() + 1
+    firstOfBlock = np.searchsorted(block, np.arange(nBlocks))
+    x0, y0 = sample[anchorRow][firstOfBlock], anchorNs[firstOfBlock]
+    x = (sample[anchorRow] - x0[block]).astype(float)
+    y = (anchorNs - y0[block]).astype(float)
+    slope = np.full(nBlocks, nominalStep)
+    offset = np.zeros(nBlocks)
+    keepAnchor = np.ones(len(x), dtype=bool)
+    for _ in range(2): # fit, then refit without anchors more than a second off
+        w = keepAnchor.astype(float)
+        nA = np.bincount(block, weights=w, minlength=nBlocks)
+        sx = np.bincount(block, weights=w * x, minlength=nBlocks)
+        sy = np.bincount(block, weights=w * y, minlength=nBlocks)
+        sxx = np.bincount(block, weights=w * x * x, minlength=nBlocks)
+        sxy = np.bincount(block, weights=w * x * y, minlength=nBlocks)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            fitSlope = (nA * sxy - sx * sy) / (nA * sxx - sx * sx)
+        usable = np.isfinite(fitSlope) & (np.abs(fitSlope / nominalStep - 1) < 0.01) # else keep the nominal period
+        slope = np.where(usable, fitSlope, nominalStep)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            offset = np.where(nA > 0, (sy - slope * sx) / nA, 0.0)
+        keepAnchor = np.abs(y - offset[block] - slope[block] * x) < 1e9
+
+    # every good row uses the fit of the block of the last anchor before it (the first block before the first anchor)
+    rowBlock = block[np.clip(np.searchsorted(anchorRow, np.arange(len(good)), side='right') - 1, 0, None)]
+    timeNs[good] = y0[rowBlock] + np.round(offset[rowBlock] + slope[rowBlock] * (sample - x0[rowBlock])).astype(np.int64)
+    droppedBefore[good] = np.maximum(step - 1, 0)
+    # across a counter reset the count says nothing about the gap, use the reconstructed times
+    breakRows = anchorRow[breakBefore]
+    gap = (timeNs[good][breakRows] - timeNs[good][breakRows - 1]) / nominalStep
+    droppedBefore[good[breakRows]] = np.maximum(np.round(gap).astype(np.int64) - 1, 0)
+
+    time = timeNs.view('datetime64[ns]')
+    inRange = ~np.isnat(time) & (time <= np.datetime64(highTimeCutoff)) & (time >= np.datetime64(lowTimeCutoff))
+    time[~inRange] = np.datetime64('NaT')
+    order = np.flatnonzero(inRange)
+    order = order[np.argsort(time[order], kind='stable')]
+    return time, order, droppedBefore
+
+
 
 
 
@@ -424,7 +864,45 @@ def timeAlignmentV2(data, sLines,
 ###################
 ###################
 
-def parseDatabaseLines(dataLines, barFlag=False):
+class _IndexedLines:
+    """
+    (index, stripped line) pairs of the D lines of dataLines for DlineParser, made on the fly while converting
+    so no per line tuples or copies of the text are kept
+    """
+
+    def __init__(self, lines, idx):
+        self.lines = lines
+        self.idx = idx
+
+    def __len__(self):
+        return len(self.idx)
+
+    def __iter__(self):
+        lines = self.lines
+        for i in self.idx:
+            yield i, lines[i].strip()
+
+
+def _lowMemoryChunkRows(memoryBudget, nRows, nCols, nSlines=0, itemsize=8):
+    """
+    Rows per conversion block that keep the low memory pipeline within memoryBudget bytes
+
+    Raises:
+        MemoryError: if the aligned buffers alone don't fit in the budget
+    """
+    # parsed buffer and sorted output, plus line numbers, index, time, sort order and alignment scratch
+    bytesPerRow = itemsize * (2 * nCols + 8)
+    slineBytes = 512 # text, tuple and parsed row of one S line
+    working = nRows * bytesPerRow + nSlines * slineBytes
+    if working > memoryBudget:
+        raise MemoryError('parsing %d D lines needs about %.0f MB, more than the %.0f MB budget; '
+                          'use outofcore.processOutOfCore for this record' % (nRows, working / 1e6, memoryBudget / 1e6))
+    textBytesPerRow = 2048 # split strings of one D line while converting
+    return int(min(max((memoryBudget - working) // textBytesPerRow, 1024), max(nRows, 1)))
+
+
+def parseDatabaseLines(dataLines, barFlag=False, metrics=None, parseGPS=False, lowMemory=False, memoryBudget=None,
+                       alignMethod='legacy'):
     """
     This is a wrapper function to do all the parsing of the raw data lines.
     It does the S and D lines and then combines everything into one pandas dataframe
@@ -433,21 +911,37 @@ def parseDatabaseLines(dataLines, barFlag=False):
     Args:
         dataLines (list): list of lines of raw data from the LECS system
         barFlag (bool, optional): Do you want a loading bar?. Defaults to False.
+        metrics (metrics.PipelineMetrics, optional): collects wall time, rows in/out and dropped rows
+            for the classify, D-parse, S-parse, align and filter stages. Defaults to None (no instrumentation).
+        parseGPS (bool, optional): decode the $ lines and merge lat/lon onto the data (see GPSlineParser, mergeGPS). Defaults to False.
+        lowMemory (bool, optional): keep only the line numbers of the D lines and convert their text in blocks straight
+            from dataLines, align with alignTimeIndex (no copies, no NaT rows written)
+            and build the sorted output with a single take. Same rows as the default path (rows with the same
+            time stay in line order). Defaults to False.
+        memoryBudget (int, optional): bytes the low memory pipeline may use on top of the raw lines, sets the block size and raises
+            MemoryError up front if the record can't fit (implies lowMemory). Defaults to None.
+        alignMethod (str, optional): 'legacy' (timeAlignmentV2 semantics) or 'clock' (unwrapped sample counter fitted
+            to the S line clock, see reconstructSampleClock, adds a droppedBefore column). Defaults to 'legacy'.
 
     Returns:
         _type_: _description_
     """
     
     ii = 0 ## iterator
+    lowMemory = lowMemory or memoryBudget is not None
+    if lowMemory and not hasattr(dataLines, '__getitem__'):
+        dataLines = list(dataLines)
     
     ## empty lists to fill
-    DlinesPre = []
+    DlinesPre = array('q') if lowMemory else [] # low memory: only the line numbers, the text is read again when converting
     SlinesPre = []
-    ## this is unused right now #TODO: add gps parsing when the gps is working
+    ## only parsed with parseGPS=True
     gpsPre = []
     idx = 0
     ## optional print debugging line
     # print('Splitting D and Slines')
+    if metrics is not None:
+        classify = metrics.start('classify') # lines are counted in the loop, dataLines may be a generator
     for l in bar(dataLines, disable=True): ## "bar" function creates a progress bar for the loop
 
         l = l.strip() # strip empty spaces in data line
@@ -455,7 +949,7 @@ def parseDatabaseLines(dataLines, barFlag=False):
         # sort by type of data 
         # TODO: add Met parsing when the met data is working
         if 'D:' in l:
-            DlinesPre.append((idx, l))
+            DlinesPre.append(idx if lowMemory else (idx, l))
         elif 'S:' in l:
             SlinesPre.append((idx,l))
         elif '$' in l:
@@ -464,16 +958,72 @@ def parseDatabaseLines(dataLines, barFlag=False):
             
         ii+=1 ## increment the iterator (this is old fucntionality and doesnt really do anything (to be removed))
             
+    if metrics is not None:
+        classify.rowsIn = idx
+        nClassified = len(DlinesPre) + len(SlinesPre)
+        metrics.finish(nClassified + (len(gpsPre) if parseGPS else 0),
+                       {'gps line (not parsed)': 0 if parseGPS else len(gpsPre),
+                        'unclassified line': idx - nClassified - len(gpsPre)})
+            
+    if alignMethod not in ('legacy', 'clock'):
+        raise ValueError("alignMethod must be 'legacy' or 'clock'")
     ## parse the data lines
-    Dlines = DlineParser(DlinesPre)
+    chunkSize = None
+    if memoryBudget is not None:
+        chunkSize = _lowMemoryChunkRows(memoryBudget, len(DlinesPre), dLineFullLength + 2,
+                                        len(SlinesPre) + (len(gpsPre) if parseGPS else 0))
+    elif lowMemory:
+        chunkSize = 8192 # about 16 MB of split strings
+    if lowMemory:
+        DlinesPre = _IndexedLines(dataLines, DlinesPre)
+    nDlinesPre = len(DlinesPre)
+    if metrics is not None:
+        metrics.start('D-parse', nDlinesPre)
+    Dlines = DlineParser(DlinesPre, chunkSize=chunkSize)
+    del DlinesPre # the raw text is no longer needed
+    if metrics is not None:
+        metrics.finish(len(Dlines), {'wrong number of fields or not a number': nDlinesPre - len(Dlines)})
     # print('Parse S lines')
+    if metrics is not None:
+        metrics.start('S-parse', len(SlinesPre))
     Slines = SlineParser(SlinesPre)
+    if metrics is not None:
+        metrics.finish(len(Slines), {'date out of range': len(SlinesPre) - len(Slines)})
     # print(Slines.head())
     ## run the time alignment
-    Dlines = timeAlignmentV2(Dlines, Slines)
+    if metrics is not None:
+        metrics.start('align', len(Dlines))
+    droppedBefore = None
+    if alignMethod == 'clock':
+        time, order, droppedBefore = reconstructSampleClock(Dlines, Slines)
+    elif lowMemory:
+        time, order = alignTimeIndex(Dlines, Slines)
+    else:
+        Dlines = timeAlignmentV2(Dlines, Slines)
+    if metrics is not None:
+        metrics.finish(len(Dlines))
     # print(Dlines.head())
     # remove bad timestamps
-    parsedDataframe = Dlines[~np.isnat(Dlines.time)]
+    if metrics is not None:
+        metrics.start('filter', len(Dlines))
+    if lowMemory or alignMethod == 'clock': # one take of the valid rows in time order
+        values = Dlines.to_numpy()
+        parsedDataframe = pd.DataFrame(values[order], columns=Dlines.columns, index=Dlines.index[order], copy=False)
+        parsedDataframe['time'] = time[order]
+        if droppedBefore is not None:
+            parsedDataframe['droppedBefore'] = droppedBefore[order]
+    else:
+        parsedDataframe = Dlines[~np.isnat(Dlines.time)]
     sDataFrame = Slines[~np.isnat(Slines.time)]
+    if metrics is not None:
+        metrics.finish(len(parsedDataframe), {'no valid timestamp': len(Dlines) - len(parsedDataframe)})
+
+    if parseGPS:
+        if metrics is not None:
+            metrics.start('gps-parse', len(gpsPre))
+        gps = GPSlineParser(gpsPre)
+        parsedDataframe = mergeGPS(parsedDataframe, gps)
+        if metrics is not None:
+            metrics.finish(len(gps), {'bad checksum or unsupported sentence': len(gpsPre) - len(gps)})
 
     return parsedDataframe, sDataFrame
@@ -0,0 +1,201 @@
+"""
+Compressed archive of raw LECS lines with random access by time.
+
+The raw lines are stored in independently zlib compressed blocks of about blockLines lines. Blocks are cut
+at S lines that SlineParser keeps (like outofcore.iterChunks), so any run of consecutive blocks plus the
+first line of the block after it parses exactly like the same lines of the original log.
+A sidecar index (<archive>.idx.npz) holds the byte offset, size, line numbers and the first/last S line
+ADV time of every block, so a time range only reads and decompresses the blocks that cover it.
+
+Example:
+    writeArchive(iterRawLines('raw.log'), 'raw.lecsz')
+    lines = readArchive('raw.lecsz', '2023-06-01 12:00', '2023-06-01 14:00')
+    parsed, slines = parseDatabaseLines(lines)
+
+"""
+
+import itertools
+import os
+import zlib
+import numpy as np
+import pandas as pd
+
+from ._internalParserFuncsV2 import SlineParser
+from .outofcore import iterChunks
+
+ARCHIVE_VERSION = 1
+_INDEX_FIELDS = ('offset', 'size', 'firstLine', 'nLines', 'firstTime', 'lastTime')
+_NAT = np.iinfo(np.int64).min
+
+
+def indexPath(path):
+    """
+    path of the sidecar index of an archive
+    """
+    return path + '.idx.npz'
+
+
+def _blockTimes(lines):
+    """
+    first and last ADV time (int64 ns, NaT as int64 min) of the S lines of a block, parsed in one go
+    """
+    sLines = [(i, l.strip()) for i, l in enumerate(lines) if 'S:' in l and 'D:' not in l]
+    if len(sLines) == 0:
+        return _NAT, _NAT
+    timeADV = SlineParser(sLines, timeOnly=False)['timeADV'] # malformed fields become NaT
+    timeADV = pd.to_datetime(timeADV).dropna()
+    if len(timeADV) == 0:
+        return _NAT, _NAT
+    tNs = timeADV.to_numpy(dtype='datetime64[ns]').astype(np.int64)
+    return tNs.min(), tNs.max()
+
+
+def loadArchiveIndex(path):
+    """
+    Block index of an archive
+
+    Args:
+        path (str): archive path
+
+    Returns:
+        pandas dataframe: one row per block with offset, size (compressed bytes), firstLine, nLines,
+            firstTime and lastTime (first/last S line ADV time)
+    """
+    if not os.path.exists(indexPath(path)):
+        return pd.DataFrame({name: np.array([], dtype=np.int64) for name in _INDEX_FIELDS})
+    with np.load(indexPath(path)) as idx:
+        if int(idx['version']) != ARCHIVE_VERSION:
+            raise ValueError('unsupported archive version %d' % int(idx['version']))
+        index = pd.DataFrame({name: idx[name] for name in _INDEX_FIELDS})
+    for name in ('firstTime', 'lastTime'):
+        index[name] = index[name].to_numpy().view('datetime64[ns]')
+    return index
+
+
+def _saveArchiveIndex(index, path):
+    arrays = {name: np.asarray(index[name]).astype('datetime64[ns]').view(np.int64) if name.endswith('Time')
+              else np.asarray(index[name], dtype=np.int64) for name in _INDEX_FIELDS}
+    tmp = indexPath(path) + '.tmp.npz'
+    np.savez(tmp, version=ARCHIVE_VERSION, **arrays)
+    os.replace(tmp, indexPath(path))
+
+
+def writeArchive(lines, path, blockLines=65536, level=6, append=True):
+    """
+    Compress raw lines into an archive (streamed, one block in memory at a time)
+
+    Args:
+        lines (iterable): raw lines, e.g. outofcore.iterRawLines(paths)
+        path (str): archive path
+        blockLines (int, optional): minimum lines per block (65536 is about an hour of 16 Hz data). Defaults to 65536.
+        level (int, optional): zlib compression level. Defaults to 6.
+        append (bool, optional): add the lines after the existing content of the archive, the last block is
+            rewritten with them so blocks stay cut at S lines. Defaults to True.
+
+    Returns:
+        int: number of blocks written (including the rewritten last block)
+    """
+    if not append or not os.path.exists(path):
+        open(path, 'wb').close()
+        index = loadArchiveIndex(path).iloc[:0]
+    else:
+        index = loadArchiveIndex(path)
+    newBlocks = []
+
+    with open(path, 'r+b') as fid:
+        if len(index): # the last block ends with the open tail of the previous write, cut it again with the new lines
+            tail = _readBlock(fid, int(index['offset'].iloc[-1]), int(index['size'].iloc[-1]))
+            lines = itertools.chain(tail, lines)
+            index = index.iloc[:-1]
+        lineNo = int(index['firstLine'].iloc[-1] + index['nLines'].iloc[-1]) if len(index) else 0
+        offset = int(index['offset'].iloc[-1] + index['size'].iloc[-1]) if len(index) else 0
+        fid.seek(offset)
+        fid.truncate() # drops anything written after the last indexed block by an interrupted write
+        for chunk, _, horizon in iterChunks(lines, chunkLines=blockLines):
+            block = chunk if horizon is None else chunk[:-1] # the closing S line starts the next block
+            data = zlib.compress('\n'.join(block).encode('utf-8', errors='replace'), level)
+            fid.write(data)
+            firstTime, lastTime = _blockTimes(block)
+            newBlocks.append((offset, len(data), lineNo, len(block), firstTime, lastTime))
+            offset += len(data)
+            lineNo += len(block)
+
+    if newBlocks:
+        new = pd.DataFrame(newBlocks, columns=list(_INDEX_FIELDS))
+        for name in ('firstTime', 'lastTime'):
+            new[name] = new[name].to_numpy(dtype=np.int64).view('datetime64[ns]')
+        index = pd.concat([index, new], ignore_index=True) if len(index) else new
+    _saveArchiveIndex(index, path)
+    return len(newBlocks)
+
+
+def _readBlock(fid, offset, size):
+    fid.seek(offset)
+    return zlib.decompress(fid.read(size)).decode('utf-8').split('\n')
+
+
+def iterArchive(path):
+    """
+    Stream all the lines of an archive in order (e.g. into outofcore.processOutOfCore)
+
+    Yields:
+        str: raw lines
+    """
+    index = loadArchiveIndex(path)
+    with open(path, 'rb') as fid:
+        for offset, size in zip(index['offset'], index['size']):
+            yield from _readBlock(fid, int(offset), int(size))
+
+
+def selectBlocks(index, start=None, end=None):
+    """
+    Positions of the consecutive blocks that cover a time range
+
+    Args:
+        index (pandas dataframe): output of loadArchiveIndex
+        start (datetime like, optional): start of the range. Defaults to None (start of the archive).
+        end (datetime like, optional): end of the range. Defaults to None (end of the archive).
+
+    Returns:
+        np.ndarray: block positions
+    """
+    n = len(index)
+    first = index['firstTime'].to_numpy(dtype='datetime64[ns]')
+    last = index['lastTime'].to_numpy(dtype='datetime64[ns]') + np.timedelta64(1, 's') # D lines of the last second
+    timed = ~np.isnat(first)
+    covers = timed.copy()
+    if start is not None:
+        covers &= last >= np.datetime64(pd.Timestamp(start))
+    if end is not None:
+        covers &= first <= np.datetime64(pd.Timestamp(end))
+    if start is None and end is None:
+        return np.arange(n)
+    if not covers.any():
+        return np.array([], dtype=np.int64)
+    hits = np.flatnonzero(covers)
+    return np.arange(hits[0], hits[-1] + 1) # untimed blocks in between are part of the range
+
+
+def readArchive(path, start=None, end=None):
+    """
+    Raw lines of the blocks that cover a time range, ready for parseDatabaseLines.
+    The first line of the following block (its S line) is added so the last segment of the range is aligned.
+
+    Args:
+        path (str): archive path
+        start (datetime like, optional): start of the range (S line ADV time). Defaults to None.
+        end (datetime like, optional): end of the range. Defaults to None.
+
+    Returns:
+        list: raw lines (a bit more than the range, trim the parsed data by time)
+    """
+    index = loadArchiveIndex(path)
+    blocks = selectBlocks(index, start, end)
+    lines = []
+    with open(path, 'rb') as fid:
+        for k in blocks:
+            lines.extend(_readBlock(fid, int(index['offset'].iloc[k]), int(index['size'].iloc[k])))
+        if len(blocks) and blocks[-1] + 1 < len(index):
+            nxt = index.iloc[blocks[-1] + 1]
+            lines.append(_readBlock(fid, int(nxt['offset']), int(nxt['size']))[0])
+    return lines
@@ -6,9 +6,7 @@ tools for running calibrations
 """
 
 
-from curses import raw
 import numpy as np
-from sklearn.linear_model import LinearRegression
 import pandas as pd
 import json
 import os
@@ -23,7 +21,95 @@ G_o2 = 0.000000e+00,
 H_o2 = 1.000000e+00,
 )
 
-def convert_raw_o2(voltO2,temp,cal_coeffs=do_cal_coeffs):
+def _chunk_slices(n, chunkSize=None):
+    """
+    Yield slices that cover an array of length n in blocks of chunkSize (one block if None)
+    """
+    if chunkSize is None or chunkSize >= n:
+        yield slice(0, n)
+    else:
+        for start in range(0, n, int(chunkSize)):
+            yield slice(start, min(start + int(chunkSize), n))
+
+
+def polyval_into(x, coeffs, out=None, dtype=np.float64, chunkSize=None):
+    """
+    Evaluate coeffs[0] + coeffs[1]*x + coeffs[2]*x**2 + ... with Horner's rule,
+    writing straight into an output buffer instead of building a temporary per power.
+
+    Args:
+        x (array like): 1-D input values (e.g. raw rinko temperature voltage), a scalar is taken as one value
+        coeffs (sequence): polynomial coefficients in ascending order
+        out (np.ndarray, optional): preallocated 1-D output buffer, may be x itself. Defaults to None (allocated).
+        dtype (np.dtype, optional): dtype of the allocated output (use np.float32 to halve memory). Defaults to np.float64.
+        chunkSize (int, optional): evaluate in blocks of this many samples to bound scratch memory. Defaults to None (one block).
+
+    Returns:
+        np.ndarray: out, filled with the polynomial values
+    """
+    x = np.atleast_1d(x)
+    if out is None:
+        out = np.empty(x.shape, dtype=dtype)
+    aliased = np.shares_memory(x, out)
+
+    for sl in _chunk_slices(x.shape[0], chunkSize):
+        xs = x[sl].copy() if aliased else x[sl] # only a chunk sized copy when evaluating in place
+        o = out[sl]
+        o[...] = coeffs[-1]
+        for c in coeffs[-2::-1]:
+            np.multiply(o, xs, out=o)
+            np.add(o, c, out=o)
+
+    return out
+
+
+def do_percent_into(voltO2, temp, out=None, cal_coeffs=do_cal_coeffs, dtype=np.float64, chunkSize=None):
+    """
+    Fused evaluation of the rinko DO expression (see convert_raw_o2) into a preallocated buffer.
+    Only one chunk sized scratch array is used regardless of the record length.
+
+    Args:
+        voltO2 (array like): 1-D raw o2 voltage from rinko (or a scalar)
+        temp (array like): 1-D calibrated temperature from rinko (or a scalar), broadcast against voltO2
+        out (np.ndarray, optional): preallocated 1-D output buffer. Defaults to None (allocated).
+        cal_coeffs (dict, optional): cal coeffficients for the rinkos. Defaults to do_cal_coeffs.
+        dtype (np.dtype, optional): dtype of the allocated output and scratch. Defaults to np.float64.
+        chunkSize (int, optional): evaluate in blocks of this many samples. Defaults to None (one block).
+
+    Returns:
+        np.ndarray: out, filled with o2 as percent saturation
+    """
+    voltO2, temp = np.broadcast_arrays(np.atleast_1d(voltO2), np.atleast_1d(temp))
+    n = voltO2.shape[0]
+    if out is None:
+        out = np.empty(voltO2.shape, dtype=dtype)
+    aliased = np.shares_memory(voltO2, out)
+    scratch = np.empty(n if chunkSize is None else min(n, int(chunkSize)), dtype=out.dtype)
+
+    for sl in _chunk_slices(n, chunkSize):
+        o = out[sl]
+        s = scratch[:o.shape[0]]
+        # s = 1 + D*(temp - 25)
+        np.subtract(temp[sl], 25, out=s)
+        np.multiply(s, cal_coeffs['D_o2'], out=s)
+        np.add(s, 1, out=s)
+        # o = B / ((voltO2 - F)*s + C + F)
+        np.subtract(voltO2[sl].copy() if aliased else voltO2[sl], cal_coeffs['F_o2'], out=o)
+        np.multiply(o, s, out=o)
+        np.add(o, cal_coeffs['C_o2'], out=o)
+        np.add(o, cal_coeffs['F_o2'], out=o)
+        np.divide(cal_coeffs['B_o2'], o, out=o)
+        # Pprime = A / s + o
+        np.divide(cal_coeffs['A_o2'], s, out=s)
+        np.add(o, s, out=o)
+        # do_percent = G + H * Pprime
+        np.multiply(o, cal_coeffs['H_o2'], out=o)
+        np.add(o, cal_coeffs['G_o2'], out=o)
+
+    return out
+
+
+def convert_raw_o2(voltO2,temp,cal_coeffs=do_cal_coeffs, dtype=np.float64, chunkSize=None):
     """
     Converts raw o2 voltage readings to percent saturation
 
@@ -31,14 +117,17 @@ def convert_raw_o2(voltO2,temp,cal_coeffs=do_cal_coeffs):
         voltO2 (_type_): Raw o2 data from rinko
         temp (_type_): temp from rinko
         cal_coeffs (_type_, optional): cal coeffficients for the rinkos. Defaults to do_cal_coeffs.
+        dtype (np.dtype, optional): output dtype, np.float32 halves the memory. Defaults to np.float64.
+        chunkSize (int, optional): evaluate in blocks of this many samples. Defaults to None.
 
     Returns:
-        _type_: calibrated o2 as percent saturation
+        _type_: calibrated o2 as percent saturation (a Series if voltO2 is a Series, a scalar for scalar inputs)
     """
 
-    
-    Pprime = ((cal_coeffs['A_o2']) /( 1 + cal_coeffs['D_o2']*(temp -25))) + (cal_coeffs['B_o2'] / ((voltO2 - cal_coeffs['F_o2'])*(1+cal_coeffs['D_o2']*(temp -25)) + cal_coeffs['C_o2'] + cal_coeffs['F_o2']))
-    do_percent = cal_coeffs['G_o2'] + cal_coeffs['H_o2'] * Pprime
+    shape = np.broadcast_shapes(np.shape(voltO2), np.shape(temp))
+    do_percent = do_percent_into(voltO2, temp, cal_coeffs=cal_coeffs, dtype=dtype, chunkSize=chunkSize).reshape(shape)[()]
+    if isinstance(voltO2, pd.Series):
+        do_percent = pd.Series(do_percent, index=voltO2.index, copy=False)
     return do_percent
 
 
@@ -60,6 +149,8 @@ def phCal_multiVarLinReg_ph_temp(rawPhCounts,temp, calCoeffs=None,**kwargs):
         raise ValueError("calCoeffs must be provided... Future versions will include automated seaphox data calibration")
     
     else:
+        from sklearn.linear_model import LinearRegression # only needed here, keeps sklearn out of the parser import
+
         jsonFile = open(calCoeffs)
         calDict = json.load(jsonFile)
 
@@ -0,0 +1,246 @@
+"""
+Batch processing of a directory of raw LECS files from the command line.
+
+Every raw file is parsed and aligned with parseDatabaseLines, its fluxes are computed with spectralECflux,
+and both are written next to each other in the output directory (see export.py). Files are processed in
+parallel worker processes.
+A manifest in the output directory records the sha256 of every input, the processing settings and the
+output version, so re-runs only process new or changed files (bump OUTPUT_VERSION when the processing changes).
+
+usage:
+    lecs-process /data/lecs/raw /data/lecs/processed --workers 8
+    python -m LECS_tools.cli /data/lecs/raw /data/lecs/processed --pattern '*.log' --format zarr
+
+"""
+
+import argparse
+import concurrent.futures
+import datetime as dt
+import fnmatch
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+
+from ._internalParserFuncsV2 import parseDatabaseLines
+from .flux import spectralECflux
+from .export import exportData, exportFlux
+
+OUTPUT_VERSION = 1 # bump when the processing changes, every file is reprocessed
+MANIFEST_NAME = 'lecs_manifest.json'
+
+log = logging.getLogger(__name__)
+
+
+def fileSha256(path, blockSize=1 << 20):
+    """
+    sha256 hex digest of a file, read in blocks
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fid:
+        for block in iter(lambda: fid.read(blockSize), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def loadManifest(path):
+    """
+    Read a processing manifest (empty if it doesn't exist yet)
+    """
+    if not os.path.exists(path):
+        return {'files': {}}
+    with open(path) as fid:
+        return json.load(fid)
+
+
+def saveManifest(manifest, path):
+    """
+    Write the manifest atomically so an interrupted run never leaves it half written
+    """
+    with open(path + '.tmp', 'w') as fid:
+        json.dump(manifest, fid, indent=1, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+def findRawFiles(inputDir, pattern='*'):
+    """
+    Raw files in inputDir (recursively) matching pattern, as paths relative to inputDir in sorted order
+    """
+    found = []
+    for root, dirs, files in os.walk(inputDir):
+        dirs.sort()
+        for name in sorted(files):
+            if fnmatch.fnmatch(name, pattern) and not name.startswith('.'):
+                found.append(os.path.relpath(os.path.join(root, name), inputDir))
+    return found
+
+
+def outputPaths(relPath, outputDir, fmt='nc'):
+    """
+    Aligned data and flux store paths of one raw file. The whole file name (with its extension) is kept,
+    so raw files like a.txt and a.log never share a store.
+    """
+    return {'data': os.path.join(outputDir, relPath + '_data.' + fmt),
+            'flux': os.path.join(outputDir, relPath + '_flux.' + fmt)}
+
+
+def needsProcessing(entry, stat, settings):
+    """
+    Check a manifest entry against the input file and settings
+
+    Returns:
+        tuple: (True/False if the file has/hasn't to be processed, None if its checksum has to decide,
+            sha256 of the file if it is known or None)
+    """
+    if entry is None or entry.get('settings') != settings or entry.get('outputVersion') != OUTPUT_VERSION:
+        return True, None
+    if any(not os.path.exists(p) for p in entry.get('outputs', {}).values()):
+        return True, None
+    if entry.get('size') == stat.st_size and entry.get('mtimeNs') == stat.st_mtime_ns:
+        return False, entry['sha256'] # untouched since it was hashed
+    return None, None # size or time stamp changed, the checksum decides
+
+
+def _removeStore(path):
+    """
+    delete a NetCDF file or Zarr directory left by an earlier run
+    """
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def processFile(path, outputs, settings):
+    """
+    Parse, align and compute the fluxes of one raw file and write the results (run in a worker process)
+
+    Args:
+        path (str): raw file
+        outputs (dict): 'data' and 'flux' store paths (see outputPaths)
+        settings (dict): processing settings (x1, x2, freq, alignMethod, lowMemory)
+
+    Returns:
+        dict: number of aligned samples and fluxes written and the outputs that were written
+            (a record too short for a flux window has no flux store)
+    """
+    with open(path, errors='replace') as fid:
+        lines = fid.read().splitlines()
+    parsed, _ = parseDatabaseLines(lines, alignMethod=settings['alignMethod'], lowMemory=settings['lowMemory'])
+    del lines
+
+    for p in outputs.values():
+        os.makedirs(os.path.dirname(p) or '.', exist_ok=True)
+        _removeStore(p) # nothing is written for empty results, don't leave the old store behind
+    nData = exportData(parsed, outputs['data'], append=False)
+    flux, fluxTimes = spectralECflux(parsed, settings['x1'], settings['x2'], freq=settings['freq'])
+    nFlux = exportFlux(flux, fluxTimes, outputs['flux'], name='%s_%s' % (settings['x1'], settings['x2']),
+                       attrs={'freq': settings['freq']}, append=False)
+    written = {key: p for key, p in outputs.items() if os.path.exists(p)}
+    return {'samples': int(nData), 'fluxes': int(nFlux), 'outputs': written}
+
+
+def runBatch(inputDir, outputDir, pattern='*', workers=None, settings=None, fmt='nc', force=False):
+    """
+    Process every new or changed raw file of inputDir in parallel and update the manifest
+
+    Args:
+        inputDir (str): directory of raw files
+        outputDir (str): directory the stores and the manifest are written to
+        pattern (str, optional): file name pattern of the raw files. Defaults to '*'.
+        workers (int, optional): worker processes. Defaults to None (one per cpu).
+        settings (dict, optional): processing settings, see processFile. Defaults to None (w/temp hourly fluxes,
+            legacy alignment with the low memory parser).
+        fmt (str, optional): 'nc' or 'zarr' output. Defaults to 'nc'.
+        force (bool, optional): reprocess every file. Defaults to False.
+
+    Returns:
+        dict: relative paths of the 'processed', 'skipped' and 'failed' files
+    """
+    defaults = {'x1': 'w', 'x2': 'temp', 'freq': '60min', 'alignMethod': 'legacy', 'lowMemory': True}
+    settings = dict(defaults, **(settings or {}))
+    os.makedirs(outputDir, exist_ok=True)
+    manifestPath = os.path.join(outputDir, MANIFEST_NAME)
+    manifest = loadManifest(manifestPath)
+    result = {'processed': [], 'skipped': [], 'failed': []}
+
+    # decide what to run, only hashing files whose size or time stamp changed
+    todo = {}
+    for relPath in findRawFiles(inputDir, pattern):
+        path = os.path.join(inputDir, relPath)
+        stat = os.stat(path)
+        entry = manifest['files'].get(relPath)
+        run, sha = (True, None) if force else needsProcessing(entry, stat, settings)
+        if run is None:
+            sha = fileSha256(path)
+            run = sha != entry['sha256']
+            if not run: # touched but unchanged
+                entry.update(size=stat.st_size, mtimeNs=stat.st_mtime_ns)
+        if not run:
+            result['skipped'].append(relPath)
+            continue
+        todo[relPath] = (path, stat, sha or fileSha256(path)) # hashed before processing, the file may still grow
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        for relPath, (path, stat, sha) in todo.items():
+            outputs = outputPaths(relPath, outputDir, fmt)
+            entry = manifest['files'].get(relPath)
+            for p in (entry or {}).get('outputs', {}).values():
+                if p not in outputs.values(): # written under an older naming or format
+                    _removeStore(p)
+            futures[pool.submit(processFile, path, outputs, settings)] = (relPath, path, stat, sha)
+        for future in concurrent.futures.as_completed(futures):
+            relPath, path, stat, sha = futures[future]
+            try:
+                counts = future.result()
+            except Exception:
+                log.exception('%s: processing failed', relPath)
+                result['failed'].append(relPath)
+                continue
+            manifest['files'][relPath] = {
+                'sha256': sha,
+                'size': stat.st_size,
+                'mtimeNs': stat.st_mtime_ns,
+                'settings': settings,
+                'outputVersion': OUTPUT_VERSION,
+                'processed': dt.datetime.now(dt.timezone.utc).isoformat(timespec='seconds'),
+                **counts,
+            }
+            saveManifest(manifest, manifestPath) # keep the progress of an interrupted run
+            result['processed'].append(relPath)
+            log.info('%s: %d samples, %d fluxes', relPath, counts['samples'], counts['fluxes'])
+
+    saveManifest(manifest, manifestPath)
+    return result
+
+
+def main(argv=None):
+    args = argparse.ArgumentParser(description='Parse, align and compute the fluxes of a directory of raw LECS files')
+    args.add_argument('input', help='directory of raw files')
+    args.add_argument('output', help='directory for the aligned data, fluxes and the manifest')
+    args.add_argument('--pattern', default='*', help="raw file name pattern (default '*')")
+    args.add_argument('--workers', type=int, default=None, help='worker processes (default one per cpu)')
+    args.add_argument('--format', choices=('nc', 'zarr'), default='nc')
+    args.add_argument('--x1', default='w')
+    args.add_argument('--x2', default='temp')
+    args.add_argument('--freq', default='60min', help='flux window spacing')
+    args.add_argument('--align', choices=('legacy', 'clock'), default='legacy', help='time alignment method')
+    args.add_argument('--low-memory', action=argparse.BooleanOptionalAction, default=True,
+                      help='vectorized low memory parser (default), --no-low-memory for the legacy timeAlignmentV2 path')
+    args.add_argument('--force', action='store_true', help='reprocess every file')
+    args = args.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    settings = {'x1': args.x1, 'x2': args.x2, 'freq': args.freq, 'alignMethod': args.align, 'lowMemory': args.low_memory}
+    result = runBatch(args.input, args.output, pattern=args.pattern, workers=args.workers,
+                      settings=settings, fmt=args.format, force=args.force)
+    log.info('%d processed, %d skipped (unchanged), %d failed',
+             len(result['processed']), len(result['skipped']), len(result['failed']))
+    return 1 if result['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
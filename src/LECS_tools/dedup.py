@@ -0,0 +1,194 @@
+"""
+Deduplication of overlapping raw LECS downloads.
+
+Every line gets a 64 bit fingerprint made from its text and its position context: the S line it follows
+and how many lines after that S line it is, so identical D lines in different seconds don't collide.
+The fingerprints of processed lines are kept (sorted, 8 bytes per line plus the S line time of the line)
+across runs and lines that were already seen are dropped before parsing. Fingerprints older than a horizon
+before the newest recorded time are pruned, and lines that old are taken as already processed.
+
+The time alignment needs every line of an S line segment, so a segment is kept whole if any of its lines
+is new, and filterNew also returns which of the kept lines are new (see dropSeenRows). Lines after the
+last S line of a batch are neither returned nor recorded, since they can only be aligned once the next S line arrives.
+
+"""
+
+import os
+import numpy as np
+import pandas as pd
+
+from ._internalParserFuncsV2 import SlineParser
+
+_MIX1 = np.uint64(0x9E3779B97F4A7C15)
+_MIX2 = np.uint64(0xBF58476D1CE4E5B9)
+_NAT = np.iinfo(np.int64).min
+
+
+def lineFingerprints(lines):
+    """
+    64 bit fingerprints of raw lines from their text, the preceding S line and the offset from it
+
+    Args:
+        lines (list): raw lines
+
+    Returns:
+        tuple: fingerprints (uint64 array), position of the S line each line follows (-1 before the first S line)
+    """
+    text = np.array([l.strip() for l in lines], dtype=object)
+    n = len(text)
+    isS = np.array([('S:' in l) and ('D:' not in l) for l in text], dtype=bool)
+    position = np.arange(n)
+    sPos = np.maximum.accumulate(np.where(isS, position, -1)) if n else position
+
+    hLine = pd.util.hash_array(text) # siphash with a fixed key, so stable between runs
+    hAnchor = np.where(sPos >= 0, hLine[np.clip(sPos, 0, None)], np.uint64(0))
+    offset = (position - sPos).astype(np.uint64)
+    with np.errstate(over='ignore'):
+        fp = hLine ^ ((hAnchor + offset * _MIX1) * _MIX2)
+    return fp, sPos
+
+
+def _segmentTimes(lines, sPos):
+    """
+    ADV time (int64 ns) of the S line each line follows, lines before the first (or an unreadable) S line
+    take the next readable S line time (NaT if there is none)
+    """
+    sIdx = np.unique(sPos[sPos >= 0])
+    timeADV = SlineParser([(i, lines[i].strip()) for i in sIdx])['timeADV']
+    sTime = pd.Series(pd.to_datetime(timeADV).reindex(sIdx).to_numpy(dtype='datetime64[ns]'), index=sIdx)
+    sTime = sTime.ffill().bfill()
+    perLine = np.full(len(sPos), _NAT, dtype=np.int64)
+    if len(sIdx):
+        perLine = sTime.reindex(np.where(sPos >= 0, sPos, sIdx[0])).to_numpy(dtype='datetime64[ns]').astype(np.int64)
+    return perLine
+
+
+class LineFingerprints:
+    """
+    Persistent set of the fingerprints of raw lines that were already processed
+
+    Args:
+        path (str, optional): .npy file the fingerprints are kept in (their times go to path + '.times.npy').
+            Defaults to None (in memory only).
+        horizon (str, optional): how long before the newest recorded time fingerprints are kept, older lines are
+            taken as processed. Defaults to '30D' (None keeps everything).
+
+    Example:
+        seen = LineFingerprints('lecs_fingerprints.npy')
+        lines, isNew = seen.filterNew(rawLines)
+        parsed, slines = parseDatabaseLines(lines)
+        parsed = dropSeenRows(parsed, isNew)
+        seen.commit()   # after the new data is safely stored
+    """
+
+    def __init__(self, path=None, horizon='30D'):
+        self.path = path
+        self.horizon = None if horizon is None else pd.Timedelta(horizon).value
+        if path is not None and os.path.exists(path):
+            self.fingerprints = np.load(path)
+            times = path + '.times.npy'
+            self.times = np.load(times) if os.path.exists(times) else np.full(len(self.fingerprints), _NAT, dtype=np.int64)
+        else:
+            self.fingerprints = np.array([], dtype=np.uint64)
+            self.times = np.array([], dtype=np.int64)
+        self._pending = []
+
+    def newest(self):
+        """
+        newest recorded S line time (int64 ns, None if there is none)
+        """
+        known = self.times[self.times != _NAT]
+        return known.max() if len(known) else None
+
+    def __len__(self):
+        return len(self.fingerprints)
+
+    def seen(self, fp):
+        """
+        boolean mask of fingerprints that are already in the set
+        """
+        if len(self.fingerprints) == 0:
+            return np.zeros(len(fp), dtype=bool)
+        pos = np.searchsorted(self.fingerprints, fp)
+        pos[pos == len(self.fingerprints)] = 0
+        return self.fingerprints[pos] == fp
+
+    def filterNew(self, lines):
+        """
+        Drop the S line segments whose lines were all seen before (in earlier runs or earlier in lines)
+
+        Args:
+            lines (list): raw lines, e.g. a new download concatenated to the end of the previous one
+
+        Returns:
+            tuple: lines to parse, boolean array marking which of them are new
+        """
+        fp, sPos = lineFingerprints(lines)
+        times = _segmentTimes(lines, sPos)
+        n = len(fp)
+        first = np.zeros(n, dtype=bool)
+        first[np.unique(fp, return_index=True)[1]] = True # repeats within the batch
+        isNew = first & ~self.seen(fp)
+        newest = self.newest()
+        if self.horizon is not None and newest is not None:
+            isNew &= ~((times != _NAT) & (times < newest - self.horizon)) # older than the kept fingerprints
+
+        # keep whole segments (S line and everything up to the next S line) that hold a new line
+        segment = sPos + 1 # 0 is everything before the first S line
+        segmentIsNew = np.bincount(segment, weights=isNew, minlength=segment.max() + 1 if n else 1) > 0
+        keep = segmentIsNew[segment] if n else isNew
+
+        # the open segment at the end can't be aligned yet, leave it to be seen as new next time;
+        # only its S line is kept (to close the segment before it)
+        closed = sPos < sPos.max() if n else isNew
+        if n and sPos.max() >= 0:
+            lastS = sPos.max()
+            keep[lastS + 1:] = False
+            keep[lastS] = lastS > 0 and keep[lastS - 1]
+        self._pending.append((fp[isNew & closed], times[isNew & closed]))
+
+        keepIdx = np.flatnonzero(keep)
+        return [lines[i] for i in keepIdx], isNew[keepIdx]
+
+    def commit(self):
+        """
+        add the fingerprints of the lines returned by filterNew to the set, prune the ones older than the horizon
+        and save it
+        """
+        if self._pending:
+            fp = np.concatenate([p[0] for p in self._pending])
+            times = np.concatenate([p[1] for p in self._pending])
+            fp, first = np.unique(fp, return_index=True)
+            times = times[first]
+            new = ~self.seen(fp)
+            fp, times = fp[new], times[new]
+            pos = np.searchsorted(self.fingerprints, fp) # merge into the sorted set without re-sorting it
+            self.fingerprints = np.insert(self.fingerprints, pos, fp)
+            self.times = np.insert(self.times, pos, times)
+            self._pending = []
+
+        newest = self.newest()
+        if newest is not None:
+            self.times[self.times == _NAT] = newest # unknown times (older files) age from now on
+            if self.horizon is not None:
+                keep = self.times >= newest - self.horizon
+                self.fingerprints, self.times = self.fingerprints[keep], self.times[keep]
+        if self.path is not None:
+            np.save(self.path + '.tmp.npy', self.fingerprints)
+            np.save(self.path + '.times.tmp.npy', self.times)
+            os.replace(self.path + '.times.tmp.npy', self.path + '.times.npy')
+            os.replace(self.path + '.tmp.npy', self.path)
+
+
+def dropSeenRows(parsed, isNew):
+    """
+    Keep only the parsed rows that come from new lines
+
+    Args:
+        parsed (pandas dataframe): output of parseDatabaseLines run on the lines from filterNew (indexed by line position)
+        isNew (np.ndarray): second output of filterNew
+
+    Returns:
+        pandas dataframe
+    """
+    return parsed[isNew[parsed.index.to_numpy(dtype=int)]]
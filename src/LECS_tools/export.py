@@ -0,0 +1,194 @@
+"""
+Export aligned LECS data and flux results to chunked, compressed Zarr or NetCDF stores.
+
+Stores are written along an appendable time dimension so new data can be added incrementally,
+and chunked along time so reading a time range only touches the chunks that cover it.
+Zarr output needs the zarr package, NetCDF output needs netCDF4.
+
+"""
+
+import os
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+TIME_UNITS = 'microseconds since 1970-01-01' # integer encoding keeps the 1/16 s timestamps exact
+DATA_CHUNK = 16 * 60 * 60 # one hour of 16 Hz samples
+FLUX_CHUNK = 24 * 30 # a month of hourly fluxes
+
+
+def dataToDataset(df, variables=None, timeCol='time', dtype=None, attrs=None):
+    """
+    Convert an aligned D-line dataframe (output of parseDatabaseLines) into an xarray dataset with a time dimension
+
+    Args:
+        df (pandas dataframe): aligned data with a time column
+        variables (list, optional): columns to keep. Defaults to None (all numeric columns).
+        timeCol (str, optional): name of the time column. Defaults to 'time'.
+        dtype (np.dtype, optional): cast the variables, e.g. np.float32 to halve the store. Defaults to None (unchanged).
+        attrs (dict, optional): global attributes of the dataset. Defaults to None.
+
+    Returns:
+        xarray dataset
+    """
+    time = pd.to_datetime(df[timeCol]).to_numpy(dtype='datetime64[ns]')
+    valid = ~np.isnat(time)
+    if variables is None:
+        variables = [c for c in df.columns if c != timeCol and pd.api.types.is_numeric_dtype(df[c])]
+
+    dataVars = {}
+    for var in variables:
+        values = pd.to_numeric(df[var], errors='coerce').to_numpy()[valid]
+        if dtype is not None:
+            values = values.astype(dtype, copy=False)
+        dataVars[var] = ('time', values)
+
+    return xr.Dataset(dataVars, coords={'time': time[valid]}, attrs=attrs or {})
+
+
+def fluxToDataset(flux, fluxTimes, name='flux', attrs=None):
+    """
+    Put the output of spectralECflux into an xarray dataset
+
+    Args:
+        flux (np.ndarray): fluxes
+        fluxTimes (np.ndarray): time stamps of the fluxes
+        name (str, optional): name of the flux variable (e.g. 'w_temp'). Defaults to 'flux'.
+        attrs (dict, optional): attributes of the flux variable (units, window parameters...). Defaults to None.
+
+    Returns:
+        xarray dataset
+    """
+    time = pd.to_datetime(np.asarray(fluxTimes)).to_numpy(dtype='datetime64[ns]')
+    ds = xr.Dataset({name: ('time', np.asarray(flux, dtype=float))}, coords={'time': time})
+    ds[name].attrs.update(attrs or {})
+    return ds
+
+
+def _inferEngine(path):
+    """
+    zarr for .zarr paths (or existing zarr directories), netcdf otherwise
+    """
+    if str(path).rstrip('/').endswith('.zarr') or os.path.isdir(path):
+        return 'zarr'
+    return 'netcdf'
+
+
+def _lastStoredTime(path, engine):
+    """
+    last time stamp already in the store (None if the store is empty)
+    """
+    if engine == 'zarr':
+        with xr.open_zarr(path) as ds:
+            if ds.sizes.get('time', 0) == 0:
+                return None
+            return ds['time'].values[-1]
+    with xr.open_dataset(path) as ds:
+        if ds.sizes.get('time', 0) == 0:
+            return None
+        return ds['time'].values[-1]
+
+
+def _appendNetcdf(ds, path):
+    """
+    append a dataset along the unlimited time dimension of an existing netcdf file
+    """
+    import netCDF4
+
+    with netCDF4.Dataset(path, 'a') as nc:
+        n0 = len(nc.dimensions['time'])
+        n1 = n0 + ds.sizes['time']
+        epoch = np.datetime64('1970-01-01T00:00:00', 'us')
+        nc.variables['time'][n0:n1] = (ds['time'].values.astype('datetime64[us]') - epoch).astype(np.int64)
+        for var in nc.variables:
+            if var == 'time':
+                continue
+            if var in ds:
+                nc.variables[var][n0:n1] = ds[var].values
+            else:
+                nc.variables[var][n0:n1] = np.full(n1 - n0, np.nan) # variable missing from this batch
+
+
+def writeDataset(ds, path, engine=None, append=True, chunkSize=DATA_CHUNK, complevel=4, skipExisting=True):
+    """
+    Write (or append) a dataset with a time dimension to a chunked, compressed Zarr or NetCDF store.
+
+    Args:
+        ds (xarray dataset): dataset with a time dimension (e.g. from dataToDataset or fluxToDataset)
+        path (str): store path, .zarr paths are written with zarr, anything else as NetCDF4
+        engine (str, optional): 'zarr' or 'netcdf'. Defaults to None (inferred from path).
+        append (bool, optional): append along time if the store exists, otherwise overwrite. Defaults to True.
+        chunkSize (int, optional): chunk length along time. Defaults to DATA_CHUNK (an hour of 16 Hz data).
+        complevel (int, optional): zlib compression level for NetCDF (zarr uses its default compressor). Defaults to 4.
+        skipExisting (bool, optional): when appending, drop samples that are not newer than the last stored time
+            so re-running over overlapping data doesn't duplicate it. Defaults to True.
+
+    Returns:
+        int: number of time samples written
+    """
+    engine = engine or _inferEngine(path)
+    ds = ds.sortby('time')
+    exists = os.path.exists(path)
+
+    if append and exists and skipExisting:
+        last = _lastStoredTime(path, engine)
+        if last is not None:
+            ds = ds.isel(time=ds['time'].values > last)
+    if ds.sizes['time'] == 0:
+        return 0
+
+    if engine == 'zarr':
+        if append and exists:
+            ds.to_zarr(path, append_dim='time')
+        else:
+            encoding = {var: {'chunks': (chunkSize,)} for var in ds.data_vars}
+            encoding['time'] = {'units': TIME_UNITS, 'dtype': 'int64', 'chunks': (chunkSize,)}
+            ds.to_zarr(path, mode='w', encoding=encoding)
+    elif engine == 'netcdf':
+        if append and exists:
+            _appendNetcdf(ds, path)
+        else:
+            encoding = {var: {'zlib': True, 'complevel': complevel, 'chunksizes': (chunkSize,)} for var in ds.data_vars}
+            encoding['time'] = {'units': TIME_UNITS, 'dtype': 'int64', 'chunksizes': (chunkSize,)}
+            ds.to_netcdf(path, mode='w', engine='netcdf4', unlimited_dims=['time'], encoding=encoding)
+    else:
+        raise ValueError("engine must be 'zarr' or 'netcdf'")
+
+    return ds.sizes['time']
+
+
+def exportData(df, path, variables=None, dtype=None, chunkSize=DATA_CHUNK, **kwargs):
+    """
+    Append aligned D-line data (output of parseDatabaseLines) to a Zarr or NetCDF store
+
+    Args:
+        df (pandas dataframe): aligned data with a time column
+        path (str): store path (.zarr for zarr, otherwise NetCDF)
+        variables (list, optional): columns to write. Defaults to None (all numeric columns).
+        dtype (np.dtype, optional): cast the variables before writing. Defaults to None.
+        chunkSize (int, optional): chunk length along time. Defaults to DATA_CHUNK.
+        **kwargs: passed on to writeDataset
+
+    Returns:
+        int: number of time samples written
+    """
+    return writeDataset(dataToDataset(df, variables=variables, dtype=dtype), path, chunkSize=chunkSize, **kwargs)
+
+
+def exportFlux(flux, fluxTimes, path, name='flux', attrs=None, chunkSize=FLUX_CHUNK, **kwargs):
+    """
+    Append spectralECflux results to a Zarr or NetCDF store
+
+    Args:
+        flux (np.ndarray): fluxes
+        fluxTimes (np.ndarray): time stamps of the fluxes
+        path (str): store path (.zarr for zarr, otherwise NetCDF)
+        name (str, optional): name of the flux variable. Defaults to 'flux'.
+        attrs (dict, optional): attributes of the flux variable. Defaults to None.
+        chunkSize (int, optional): chunk length along time. Defaults to FLUX_CHUNK.
+        **kwargs: passed on to writeDataset
+
+    Returns:
+        int: number of fluxes written
+    """
+    return writeDataset(fluxToDataset(flux, fluxTimes, name=name, attrs=attrs), path, chunkSize=chunkSize, **kwargs)
@@ -11,53 +11,204 @@ import scipy.signal as signal
 import scipy.integrate as integrate
 import xarray as xr
 
+from .windows import windowIndexFor
 
 
 
-def spectralECflux(df, x1, x2, freq='60min', fs=16, windowMinutes=30, high=0.125, low=1/(15*60)):
+
+def logFrequencyBins(fMin, fMax, nBins=40, df=None):
+    """
+    log-spaced frequency bin edges from fMin to fMax, snapped to multiples of df (the spectral resolution)
+    when given, so no bin is narrower than the frequency grid (there can be fewer than nBins bins)
+    """
+    edges = np.logspace(np.log10(fMin), np.log10(fMax), nBins + 1)
+    if df is None:
+        return edges
+    return np.unique(np.round(edges / df)) * df
+
+
+def _binCospectrum(f, psd, edges):
+    """
+    average a cross-spectrum into frequency bins and integrate it (trapezoid, like spectralECflux) up to the edges
+
+    Returns:
+        tuple: mean cospectral density per bin (the last bin includes its upper edge, e.g. the Nyquist frequency),
+            cumulative integral at every edge up to the last frequency <= edge (row 0) and up to
+            the first frequency >= edge (row 1)
+    """
+    nBins = len(edges) - 1
+    co = np.real(psd)
+    which = np.searchsorted(edges, f, side='right') - 1
+    which[f == edges[-1]] = nBins - 1
+    inside = (which >= 0) & (which < nBins)
+    total = np.bincount(which[inside], weights=co[inside], minlength=nBins)
+    count = np.bincount(which[inside], minlength=nBins)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        density = total / count
+
+    running = integrate.cumulative_trapezoid(co, f, initial=0)
+    below = np.clip(np.searchsorted(f, edges, side='right') - 1, 0, len(f) - 1)
+    above = np.clip(np.searchsorted(f, edges, side='left'), 0, len(f) - 1)
+    return density, np.vstack([running[below], running[above]])
+
+
+def spectralECflux(df, x1, x2, freq='60min', fs=16, windowMinutes=30, high=0.125, low=1/(15*60),
+                   returnCospectra=False, binEdges=None, windowIndex=None, cache=None):
     """_summary_
 
     Args:
         x1 (_type_): takes in data frame of variable 1
         x2 (_type_): data frame of variable 1
+        returnCospectra (bool, optional): also return the cospectra of every window averaged into
+            log-spaced frequency bins, with the cumulative integral at the bin edges (see integrateCospectra). Defaults to False.
+        binEdges (np.ndarray, optional): frequency bin edges for the cospectra. Defaults to None (40 log-spaced
+            bins from 1/(windowMinutes*60) to fs/2 snapped to the frequency grid of a full window, plus low and high).
+        windowIndex (windows.WindowIndex, optional): window index of df['time'] built once and reused
+            across calls (its freq is used), ValueError if it was built for other data. Defaults to None (built here).
+        cache (fluxcache.FluxCache, optional): per-window result cache, only windows whose data or
+            parameters changed are computed. Defaults to None.
 
     Returns:
         _type_: eddy covariance flux
         timeS: time stamps of fluxes
+        cospectra: (only with returnCospectra) xarray dataset with time x frequency 'cospectrum' (mean density per bin)
+            and 'bandIntegral' (cospectrum integrated over each bin), and time x edge 'cumulativeBelow'/'cumulativeAbove'
+            (cospectrum integrated from 0 up to the last/first frequency of the grid at or past every edge)
     """
     
     # spectral parameters
     window_length_seconds = windowMinutes*60
     nperseg = window_length_seconds//(1/fs)
     
-    dfGrouped =  df.groupby(pd.Grouper(freq=freq, key='time'), as_index=False, dropna=False)
+    windowIndex = windowIndexFor(df['time'], freq=freq, windowIndex=windowIndex)
+    freq = windowIndex.freq
     flux = []
     fluxTimes = []
+    if returnCospectra:
+        if binEdges is None:
+            # a full window of freq has nperseg = half its samples, i.e. a resolution of 2/(window seconds);
+            # the flux band limits are edges too so integrateCospectra gives back this flux
+            binEdges = logFrequencyBins(1/window_length_seconds, fs/2, df=2/pd.Timedelta(freq).total_seconds())
+            binEdges = np.union1d(binEdges, [low, high])
+            binEdges = binEdges[np.r_[True, np.diff(binEdges) > 1e-9 * binEdges[1:]]] # rounding duplicates
+        binEdges = np.asarray(binEdges, dtype=float)
+        cospectra = []
+        cumulatives = []
+    if cache is not None:
+        params = dict(variables=[x1, x2], fs=fs, windowMinutes=windowMinutes, high=high, low=low,
+                      binEdges=binEdges.tolist() if returnCospectra else None)
     
-    for timestamp, dfIn in dfGrouped.__iter__():   
-        if (dfIn[x1].values.shape[0] > nperseg) and (dfIn[x2].values.shape[0] > nperseg):
-            fluxTimes.append(dfIn.time.mean())
-            f, psd  = signal.csd(
-                dfIn[x1].values,
-                dfIn[x2].values,
-                fs=fs,
-                nperseg=len(dfIn[x1].values)/2,
-                noverlap=None, ## default is 50%
-                
-            
+    for k, x1In, x2In in windowIndex.windows(df[x1].to_numpy(), df[x2].to_numpy(), minLength=nperseg):
+        fluxTimes.append(windowIndex.meanTime(k))
+        if cache is not None:
+            key = cache.key(x1In, x2In, **params)
+            hit = cache.get(key)
+            if hit is not None:
+                flux.append(hit[0])
+                if returnCospectra:
+                    cospectra.append(hit[1])
+                    cumulatives.append(hit[2].reshape(2, -1))
+                continue
+        f, psd  = signal.csd(
+            x1In,
+            x2In,
+            fs=fs,
+            nperseg=len(x1In)/2,
+            noverlap=None, ## default is 50%
         )
-        
-            mask1 = f>=low
-            mask2 = f<= high
-            mask = np.logical_and(mask1, mask2)
-            
-
-            tt = integrate.trapezoid(np.real(psd[mask]), f[mask])*60*60 ## convert to hourly (still need to apply whatever other unit changes you neeed
-            flux.append(tt)
+    
+        mask1 = f>=low
+        mask2 = f<= high
+        mask = np.logical_and(mask1, mask2)
 
-                
+        tt = integrate.trapezoid(np.real(psd[mask]), f[mask])*60*60 ## convert to hourly (still need to apply whatever other unit changes you neeed
+        flux.append(tt)
+        if returnCospectra:
+            density, cumulative = _binCospectrum(f, psd, binEdges)
+            cospectra.append(density)
+            cumulatives.append(cumulative)
+        if cache is not None:
+            cache.put(key, tt, *((density, cumulative) if returnCospectra else ()))
+    if cache is not None:
+        cache.commit()
     
-    return np.hstack(flux), np.hstack(fluxTimes)
+    if len(flux) == 0: # no window long enough
+        flux, fluxTimes = np.array([]), np.array([], dtype='datetime64[ns]')
+    else:
+        flux, fluxTimes = np.hstack(flux), np.hstack(fluxTimes)
+    if not returnCospectra:
+        return flux, fluxTimes
+
+    nBins = len(binEdges) - 1
+    cumulatives = np.array(cumulatives, dtype=np.float64).reshape(-1, 2, nBins + 1)
+    cospectraDataset = xr.Dataset(
+        {
+            'cospectrum': (('time', 'frequency'), np.array(cospectra, dtype=np.float32).reshape(-1, nBins)),
+            'bandIntegral': (('time', 'frequency'), np.diff(cumulatives[:, 0], axis=1).astype(np.float32)),
+            'cumulativeBelow': (('time', 'edge'), cumulatives[:, 0]),
+            'cumulativeAbove': (('time', 'edge'), cumulatives[:, 1]),
+        },
+        coords={
+            'time': pd.to_datetime(fluxTimes).to_numpy(dtype='datetime64[ns]'),
+            'frequency': np.sqrt(binEdges[:-1] * binEdges[1:]), # geometric bin centre
+            'f_low': ('frequency', binEdges[:-1]),
+            'f_high': ('frequency', binEdges[1:]),
+            'edge': binEdges,
+        },
+        attrs={'variables': '%s,%s' % (x1, x2), 'fs': fs, 'freq': freq, 'windowMinutes': windowMinutes},
+    )
+    return flux, fluxTimes, cospectraDataset
 
 
+def integrateCospectra(cospectra, low=1/(15*60), high=0.125):
+    """
+    Flux from the cospectra of spectralECflux(..., returnCospectra=True) over a different band,
+    without recomputing the spectra. Limits on bin edges give the same flux as spectralECflux with that band,
+    limits inside a bin interpolate the cumulative integral linearly between its edges.
 
+    Args:
+        cospectra (xarray dataset): cospectra output of spectralECflux
+        low (float, optional): low frequency of the band. Defaults to 1/(15*60).
+        high (float, optional): high frequency of the band. Defaults to 0.125.
+
+    Returns:
+        xarray DataArray: flux per window (hourly units like spectralECflux)
+    """
+    edges = cospectra['edge'].to_numpy()
+
+    def atFrequency(cumulative, x):
+        k = np.clip(np.searchsorted(edges, x, side='right') - 1, 0, len(edges) - 2)
+        w = np.clip((x - edges[k]) / (edges[k + 1] - edges[k]), 0, 1)
+        values = cumulative.to_numpy()
+        return values[:, k] * (1 - w) + values[:, k + 1] * w
+
+    flux = atFrequency(cospectra['cumulativeBelow'], high) - atFrequency(cospectra['cumulativeAbove'], low)
+    return xr.DataArray(flux*60*60, coords={'time': cospectra['time']}, dims='time')
+
+
+
+
+
+def windowCovariance(df, x1, x2, freq='60min', windowIndex=None, minLength=0):
+    """
+    Covariance of two variables in every time window (plain eddy covariance, no spectral band limits)
+
+    Args:
+        df (pandas dataframe): aligned data with a time column
+        x1 (str): first variable
+        x2 (str): second variable
+        freq (str, optional): window length. Defaults to '60min'.
+        windowIndex (windows.WindowIndex, optional): window index of df['time'] to reuse, ValueError if it was built
+            for other data. Defaults to None (built here).
+        minLength (int, optional): skip windows with this many samples or fewer. Defaults to 0.
+
+    Returns:
+        tuple: covariance per window, time stamps of the windows
+    """
+    windowIndex = windowIndexFor(df['time'], freq=freq, windowIndex=windowIndex)
+    cov = []
+    covTimes = []
+    for k, x1In, x2In in windowIndex.windows(df[x1].to_numpy(), df[x2].to_numpy(), minLength=max(minLength, 1)):
+        cov.append(np.mean((x1In - x1In.mean()) * (x2In - x2In.mean())))
+        covTimes.append(windowIndex.meanTime(k))
+    return np.array(cov), np.array(covTimes, dtype='datetime64[ns]')
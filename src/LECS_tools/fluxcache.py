@@ -0,0 +1,91 @@
+"""
+Persistent per-window cache of the spectral flux results.
+
+Every window is keyed by a blake2b hash of its input arrays and the flux parameters (variable pair, fs,
+windowMinutes, high, low and the cospectrum bins), so re-running spectralECflux over a growing record only
+computes the windows that are new or whose data changed. Results are kept in a sqlite file.
+
+Example:
+    cache = FluxCache('lecs_flux_cache.sqlite')
+    flux, fluxTimes = spectralECflux(parsed, 'w', 'temp', cache=cache)
+    print(cache.hits, cache.misses)
+
+"""
+
+import hashlib
+import json
+import sqlite3
+import numpy as np
+
+
+CACHE_VERSION = 2 # bumped when the stored results change, older caches are emptied
+
+
+class FluxCache:
+    """
+    sqlite backed store of per-window flux results
+
+    Args:
+        path (str, optional): sqlite file. Defaults to ':memory:' (not persistent).
+    """
+
+    def __init__(self, path=':memory:'):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        if self.db.execute('PRAGMA user_version').fetchone()[0] != CACHE_VERSION:
+            self.db.execute('DROP TABLE IF EXISTS windows')
+            self.db.execute('PRAGMA user_version = %d' % CACHE_VERSION)
+        self.db.execute('CREATE TABLE IF NOT EXISTS windows '
+                        '(key BLOB PRIMARY KEY, flux REAL, cospectrum BLOB, cumulative BLOB) WITHOUT ROWID')
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return self.db.execute('SELECT COUNT(*) FROM windows').fetchone()[0]
+
+    @staticmethod
+    def key(*arrays, **params):
+        """
+        content hash of the window arrays and the flux parameters
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(json.dumps(params, sort_keys=True, default=repr).encode())
+        for arr in arrays:
+            arr = np.ascontiguousarray(arr, dtype=np.float64)
+            digest.update(np.int64(arr.size).tobytes())
+            digest.update(arr.data)
+        return digest.digest()
+
+    def get(self, key):
+        """
+        Cached result of a window
+
+        Returns:
+            tuple: flux, cospectrum and cumulative integral at the bin edges (flattened, None if not stored),
+                or None if the window isn't cached
+        """
+        row = self.db.execute('SELECT flux, cospectrum, cumulative FROM windows WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        flux, cospectrum, cumulative = row
+        return (flux,
+                None if cospectrum is None else np.frombuffer(cospectrum, dtype=np.float64),
+                None if cumulative is None else np.frombuffer(cumulative, dtype=np.float64))
+
+    def put(self, key, flux, cospectrum=None, cumulative=None):
+        """
+        store the result of a window (written to disk on commit)
+        """
+        self.db.execute('INSERT OR REPLACE INTO windows VALUES (?, ?, ?, ?)', (
+            key, float(flux),
+            None if cospectrum is None else np.asarray(cospectrum, dtype=np.float64).tobytes(),
+            None if cumulative is None else np.asarray(cumulative, dtype=np.float64).tobytes()))
+
+    def commit(self):
+        self.db.commit()
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
@@ -0,0 +1,225 @@
+"""
+Streaming instrument health summaries from the S line telemetry.
+
+HealthMonitor folds batches of decoded S lines (SlineParser(..., timeOnly=False)) into per-hour summaries
+of battery voltage, tilt, sound speed and temperature. Only the last maxHours hours are kept
+(a bounded deque), and the monitor can be pickled between runs, so the alerts never need the raw history.
+
+Alerts:
+- battery: hourly mean voltage below batteryMin, or falling faster than batteryDropPerDay over the last trendHours
+- tilt: tilt (from pitch and roll) above tiltLimit in an hour, or the hourly mean tilt moving more than
+  tiltShift from the deployment baseline (lander knocked over or sinking into the bed)
+
+"""
+
+import collections
+import logging
+import pickle
+import numpy as np
+import pandas as pd
+
+log = logging.getLogger(__name__)
+
+_HOUR = pd.Timedelta('1h').value
+
+
+def tiltAngle(pitch, roll):
+    """
+    tilt from vertical in degrees from pitch and roll in degrees
+    """
+    p, r = np.radians(np.asarray(pitch, dtype=float)), np.radians(np.asarray(roll, dtype=float))
+    return np.degrees(np.arccos(np.clip(np.cos(p) * np.cos(r), -1, 1)))
+
+
+class HealthMonitor:
+    """
+    Rolling per-hour health summaries of the S line telemetry with alerts
+
+    Args:
+        maxHours (int, optional): hours of summaries kept. Defaults to 24*30.
+        batteryMin (float, optional): alert below this hourly mean voltage. Defaults to 11.0.
+        batteryDropPerDay (float, optional): alert when the voltage falls faster than this (V/day). Defaults to 0.2.
+        trendHours (int, optional): hours in the battery trend fit. Defaults to 24.
+        tiltLimit (float, optional): alert when the tilt goes over this many degrees. Defaults to 15.0.
+        tiltShift (float, optional): alert when the hourly mean tilt moves this many degrees from the baseline. Defaults to 3.0.
+        baselineHours (int, optional): first hours whose median tilt is the baseline. Defaults to 6.
+
+    Example:
+        monitor = HealthMonitor()
+        for alert in monitor.update(SlineParser(slines, timeOnly=False)):
+            notify(alert)
+        monitor.summary()
+    """
+
+    def __init__(self, maxHours=24 * 30, batteryMin=11.0, batteryDropPerDay=0.2, trendHours=24,
+                 tiltLimit=15.0, tiltShift=3.0, baselineHours=6):
+        self.hours = collections.deque(maxlen=maxHours)
+        self.batteryMin = batteryMin
+        self.batteryDropPerDay = batteryDropPerDay
+        self.trendHours = trendHours
+        self.tiltLimit = tiltLimit
+        self.tiltShift = tiltShift
+        self.baselineHours = baselineHours
+        self.baselineTilt = None
+        self._baseline = []
+        self._checked = None # last hour whose alerts were checked
+        self.alerts = collections.deque(maxlen=1000)
+
+    def _aggregate(self, sLines):
+        """
+        per-hour partial sums of one batch (dict of arrays keyed by statistic)
+        """
+        time = pd.to_datetime(sLines['timeADV']).to_numpy(dtype='datetime64[ns]')
+        valid = ~np.isnat(time)
+        tNs = time[valid].astype(np.int64)
+        hour = tNs - tNs % _HOUR
+        bins, which = np.unique(hour, return_inverse=True)
+        n = len(bins)
+
+        def column(name):
+            return sLines[name].to_numpy(dtype=float)[valid]
+
+        out = {'hour': bins, 'count': np.bincount(which, minlength=n)}
+        tilt = tiltAngle(column('pitch'), column('roll'))
+        for name, x in (('battery', column('batteryVoltage')), ('tilt', tilt), ('soundSpeed', column('soundSpeed')),
+                        ('temp2', column('temp2'))):
+            finite = np.isfinite(x)
+            x0 = np.where(finite, x, 0.0)
+            out[name + 'N'] = np.bincount(which, weights=finite, minlength=n)
+            out[name + 'Sum'] = np.bincount(which, weights=x0, minlength=n)
+            out[name + 'SumSq'] = np.bincount(which, weights=x0 * x0, minlength=n)
+            out[name + 'Min'] = np.full(n, np.inf)
+            out[name + 'Max'] = np.full(n, -np.inf)
+            np.minimum.at(out[name + 'Min'], which[finite], x[finite])
+            np.maximum.at(out[name + 'Max'], which[finite], x[finite])
+        return out
+
+    def update(self, sLines):
+        """
+        Add a batch of decoded S lines (in time order across batches) and check the alerts of the hours
+        it completed (an hour is complete once a later hour arrives, see flush)
+
+        Args:
+            sLines (pandas dataframe): output of SlineParser (telemetry columns and timeADV)
+
+        Returns:
+            list: new alerts (dicts with time, kind and message)
+        """
+        if len(sLines) == 0:
+            return []
+        partial = self._aggregate(sLines)
+        for k, hour in enumerate(partial['hour']):
+            row = {key: value[k] for key, value in partial.items()}
+            if self.hours and self.hours[-1]['hour'] == hour: # hour continued from the last batch
+                last = self.hours[-1]
+                for key, value in row.items():
+                    if key.endswith('Min'):
+                        last[key] = min(last[key], value)
+                    elif key.endswith('Max'):
+                        last[key] = max(last[key], value)
+                    elif key != 'hour':
+                        last[key] += value
+            elif self.hours and hour < self.hours[-1]['hour']:
+                continue # older than the summaries (replayed data)
+            else:
+                self.hours.append(row)
+        return self._checkHours(final=False)
+
+    def flush(self):
+        """
+        check the alerts of the last (still open) hour, e.g. at the end of a record
+
+        Returns:
+            list: new alerts
+        """
+        return self._checkHours(final=True)
+
+    def _checkHours(self, final):
+        if not self.hours:
+            return []
+        summary = self.summary()
+        hours = summary.index.to_numpy().astype(np.int64)
+        due = hours if final else hours[:-1]
+        if self._checked is not None:
+            due = due[due > self._checked]
+        alerts = []
+        for hour in due:
+            alerts.extend(self._check(summary, hour))
+        if len(due):
+            self._checked = due[-1]
+        for alert in alerts:
+            log.warning('%s %s: %s', alert['time'], alert['kind'], alert['message'])
+        self.alerts.extend(alerts)
+        return alerts
+
+    def _check(self, summary, hour):
+        row = summary.loc[pd.Timestamp(hour)]
+        time = pd.Timestamp(hour)
+        alerts = []
+
+        if row['batteryMean'] < self.batteryMin:
+            alerts.append(dict(time=time, kind='battery', message='mean voltage %.2f V below %.2f V' % (row['batteryMean'], self.batteryMin)))
+        recent = summary.loc[time - pd.Timedelta(hours=self.trendHours - 1):time, 'batteryMean'].dropna()
+        if len(recent) >= max(3, self.trendHours // 2):
+            days = (recent.index - recent.index[0]).total_seconds().to_numpy() / 86400
+            slope = np.polyfit(days, recent.to_numpy(), 1)[0]
+            if slope < -self.batteryDropPerDay:
+                alerts.append(dict(time=time, kind='battery', message='voltage falling %.3f V/day over %d h' % (-slope, len(recent))))
+
+        if row['tiltMax'] > self.tiltLimit:
+            alerts.append(dict(time=time, kind='tilt', message='tilt reached %.1f deg (limit %.1f)' % (row['tiltMax'], self.tiltLimit)))
+        if self.baselineTilt is None:
+            if np.isfinite(row['tiltMean']):
+                self._baseline.append(row['tiltMean'])
+            if len(self._baseline) >= self.baselineHours:
+                self.baselineTilt = float(np.median(self._baseline))
+        elif abs(row['tiltMean'] - self.baselineTilt) > self.tiltShift:
+            alerts.append(dict(time=time, kind='tilt', message='mean tilt %.1f deg moved from the %.1f deg baseline'
+                               % (row['tiltMean'], self.baselineTilt)))
+        return alerts
+
+    def summary(self):
+        """
+        Per-hour health summary of the kept hours
+
+        Returns:
+            pandas dataframe: count and mean/std/min/max of battery, tilt, soundSpeed and temp2, indexed by hour
+        """
+        if not self.hours:
+            return pd.DataFrame()
+        frame = pd.DataFrame(list(self.hours))
+        out = pd.DataFrame({'count': frame['count'].to_numpy()}, index=pd.DatetimeIndex(frame['hour'].to_numpy().astype('datetime64[ns]'), name='time'))
+        for name in ('battery', 'tilt', 'soundSpeed', 'temp2'):
+            n = frame[name + 'N'].to_numpy()
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean = frame[name + 'Sum'].to_numpy() / n
+                var = (frame[name + 'SumSq'].to_numpy() - n * mean**2) / (n - 1)
+            out[name + 'Mean'] = mean
+            out[name + 'Std'] = np.sqrt(np.clip(var, 0, None))
+            out[name + 'Min'] = np.where(n > 0, frame[name + 'Min'], np.nan)
+            out[name + 'Max'] = np.where(n > 0, frame[name + 'Max'], np.nan)
+        return out
+
+    def save(self, path):
+        """
+        pickle the monitor so the next run continues the summaries
+        """
+        with open(path, 'wb') as fid:
+            pickle.dump(self, fid)
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as fid:
+            return pickle.load(fid)
+
+
+def healthSink(monitor, sink=None):
+    """
+    Ingest sink (see ingest.runIngest) that feeds the S lines of every batch to a HealthMonitor
+    and then passes the batch on to sink
+    """
+    def wrapped(parsed, sDataFrame, source):
+        monitor.update(sDataFrame)
+        if sink is not None:
+            return sink(parsed, sDataFrame, source)
+    return wrapped
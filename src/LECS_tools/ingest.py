@@ -0,0 +1,285 @@
+"""
+Live ingestion of raw LECS data with asyncio.
+
+Tails one or more growing raw log files and/or TCP sockets, cuts the incoming lines into small
+batches at S lines (see outofcore.iterChunks), parses and aligns each batch with parseDatabaseLines
+in a worker thread and publishes the aligned batches to a sink.
+Each source feeds a bounded queue, so when parsing or the sink falls behind the readers stop
+reading (the file stays on disk and TCP flow control holds the sender) instead of buffering without limit.
+
+usage:
+    python -m LECS_tools.ingest /data/lecs/raw.log tcp://127.0.0.1:5000 --store live.zarr --health health.pkl
+
+Every source is appended to its own store (live_data_lecs_raw.log.zarr and live_tcp_127.0.0.1_5000.zarr above),
+since the sources run on separate clocks and a lagging source would otherwise lose its batches to the
+newer times already written by the others.
+
+"""
+
+import argparse
+import asyncio
+import inspect
+import logging
+import os
+import re
+
+import pandas as pd
+
+from ._internalParserFuncsV2 import parseDatabaseLines
+from .outofcore import _slineCut
+from .export import exportData, _inferEngine, _lastStoredTime
+from .health import HealthMonitor, healthSink
+
+log = logging.getLogger(__name__)
+
+
+async def tailFile(path, queue, pollInterval=0.5, fromStart=True, stopEvent=None):
+    """
+    Put the lines of a growing text file on a queue as they are written (like tail -f).
+    Partial lines are held until their newline arrives and a truncated or replaced file is reopened from the start.
+
+    Args:
+        path (str): raw log file
+        queue (asyncio.Queue): bounded queue the lines are put on
+        pollInterval (float, optional): seconds between checks for new data. Defaults to 0.5.
+        fromStart (bool, optional): read the existing content first, otherwise start at the end. Defaults to True.
+        stopEvent (asyncio.Event, optional): stop when set. Defaults to None.
+    """
+    while not os.path.exists(path):
+        if stopEvent is not None and stopEvent.is_set():
+            return
+        await asyncio.sleep(pollInterval)
+
+    fid = open(path, errors='replace', newline='')
+    inode = os.fstat(fid.fileno()).st_ino
+    if not fromStart:
+        fid.seek(0, os.SEEK_END)
+    partial = ''
+    try:
+        while stopEvent is None or not stopEvent.is_set():
+            data = fid.read(1 << 20)
+            if data:
+                lines = (partial + data).split('\n')
+                partial = lines.pop()
+                for line in lines:
+                    await queue.put(line.rstrip('\r')) # blocks when the parser is behind
+                continue
+
+            # no new data: check for rotation/truncation then wait
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                stat = None
+            if stat is not None and (stat.st_ino != inode or stat.st_size < fid.tell()):
+                fid.close()
+                fid = open(path, errors='replace', newline='')
+                inode = os.fstat(fid.fileno()).st_ino
+                partial = ''
+                continue
+            await asyncio.sleep(pollInterval)
+    finally:
+        fid.close()
+
+
+async def readSocket(host, port, queue, retryInterval=5.0, stopEvent=None):
+    """
+    Put the lines streamed by a TCP server on a queue, reconnecting if the connection drops
+
+    Args:
+        host (str): server host
+        port (int): server port
+        queue (asyncio.Queue): bounded queue the lines are put on
+        retryInterval (float, optional): seconds between reconnection attempts. Defaults to 5.0.
+        stopEvent (asyncio.Event, optional): stop when set. Defaults to None.
+    """
+    while stopEvent is None or not stopEvent.is_set():
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+        except OSError:
+            await asyncio.sleep(retryInterval)
+            continue
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                await queue.put(line.decode('utf-8', errors='replace').rstrip('\r\n'))
+        finally:
+            writer.close()
+        if stopEvent is None:
+            return
+        await asyncio.sleep(retryInterval)
+
+
+async def _publish(sink, parsed, sDataFrame, source):
+    result = sink(parsed, sDataFrame, source)
+    if inspect.isawaitable(result):
+        await result
+
+
+async def parseQueue(queue, sink, source, batchLines=160, metrics=None):
+    """
+    Take raw lines off a queue, cut them into batches at valid S lines and publish each aligned batch.
+    A batch is closed by the first valid S line after batchLines lines, which also starts the next batch,
+    so the alignment matches parsing the whole stream at once.
+    Like outofcore.processOutOfCore, aligned rows at or after the ADV time of the closing S line are held back
+    until the next batch and every published batch is sorted by time, so the published times never go backwards.
+
+    Args:
+        queue (asyncio.Queue): raw lines, None ends the stream (the last open batch is published)
+        sink (callable): called as sink(alignedData, sDataFrame, source), may be async
+        source (str): name of the source passed to the sink
+        batchLines (int, optional): minimum lines per batch (160 is about 10 s of data). Defaults to 160.
+        metrics (metrics.PipelineMetrics, optional): collects the per-stage metrics of every batch. Defaults to None.
+    """
+    batch = []
+    offset = 0
+    pending = None # aligned rows not published yet
+    noSlines = None # empty S line frame for batches without S lines to publish
+
+    async def flush(lines, offset, horizon=None, closed=True):
+        nonlocal pending, noSlines
+        try:
+            if any('D:' in l for l in lines) and any('S:' in l for l in lines):
+                parsed, sDataFrame = await asyncio.to_thread(parseDatabaseLines, lines, False, metrics)
+                if closed: # the closing S line is published with the next batch
+                    sDataFrame = sDataFrame[sDataFrame.index < len(lines) - 1]
+                parsed = parsed.set_axis(parsed.index + offset)
+                sDataFrame = sDataFrame.set_axis(sDataFrame.index + offset)
+                pending = parsed if pending is None else pd.concat([pending, parsed])
+                noSlines = sDataFrame.iloc[:0]
+            else:
+                sDataFrame = noSlines
+            if pending is None:
+                return
+
+            if not closed:
+                ready, pending = pending, None
+            elif pd.isna(horizon): # no usable time on the cut, keep holding
+                ready, pending = pending.iloc[:0], pending
+            else:
+                isReady = (pending['time'] < horizon).to_numpy()
+                ready, pending = pending[isReady], pending[~isReady]
+            ready = ready.sort_index(kind='stable').sort_values(by='time', kind='stable') # ties in line order
+            if len(ready) or len(sDataFrame):
+                await _publish(sink, ready, sDataFrame, source)
+        except Exception: # a bad batch or sink error must not stop the service
+            log.exception('%s: failed to parse/publish lines %d-%d', source, offset, offset + len(lines))
+
+    while True:
+        line = await queue.get()
+        if line is None:
+            if batch or pending is not None:
+                await flush(batch, offset, closed=False)
+            return
+        if len(batch) >= batchLines:
+            isCut, horizon = _slineCut(line)
+            if isCut:
+                batch.append(line)
+                await flush(batch, offset, horizon)
+                offset += len(batch) - 1
+                batch = [line]
+                continue
+        batch.append(line)
+
+
+def sourceStorePath(path, source):
+    """
+    store path of one source: the source name (made file name safe) added before the extension of path,
+    e.g. ('live.zarr', 'tcp://127.0.0.1:5000') -> 'live_tcp_127.0.0.1_5000.zarr'
+    """
+    root, ext = os.path.splitext(path)
+    return '%s_%s%s' % (root, re.sub(r'[^A-Za-z0-9.-]+', '_', source).strip('_'), ext)
+
+
+def exportSink(path, perSource=True, **kwargs):
+    """
+    Sink that appends every aligned batch to a Zarr/NetCDF store (see export.exportData).
+    parseQueue publishes the batches of a source in time order, so the store's time axis only grows;
+    samples not newer than the last time in the store (data replayed after a restart) are skipped.
+
+    Args:
+        path (str): store path
+        perSource (bool, optional): one store per source (see sourceStorePath). Defaults to True.
+        **kwargs: passed on to export.exportData
+    """
+    lastTimes = {} # last stored time of every store, read from the store on the first write
+
+    def sink(parsed, sDataFrame, source):
+        store = sourceStorePath(path, source) if perSource else path
+        if store not in lastTimes:
+            lastTimes[store] = _lastStoredTime(store, _inferEngine(store)) if os.path.exists(store) else None
+        if lastTimes[store] is not None:
+            parsed = parsed[(parsed['time'] > lastTimes[store]).to_numpy()]
+        if len(parsed):
+            exportData(parsed, store, skipExisting=False, **kwargs)
+            lastTimes[store] = parsed['time'].max().to_datetime64()
+    return sink
+
+
+async def runIngest(sources, sink, batchLines=160, queueSize=10000, pollInterval=0.5, stopEvent=None, metrics=None):
+    """
+    Run the ingestion service until stopEvent is set (or the sources end).
+
+    Args:
+        sources (list): raw log file paths and/or 'tcp://host:port' sockets
+        sink (callable): called as sink(alignedData, sDataFrame, source) for every batch, may be async
+        batchLines (int, optional): minimum raw lines per published batch. Defaults to 160.
+        queueSize (int, optional): raw lines buffered per source before the reader is paused. Defaults to 10000.
+        pollInterval (float, optional): file polling interval in seconds. Defaults to 0.5.
+        stopEvent (asyncio.Event, optional): set to shut down, open batches are published. Defaults to None (run forever).
+        metrics (metrics.PipelineMetrics, optional): collects the per-stage metrics of every batch. Defaults to None.
+    """
+    if stopEvent is None:
+        stopEvent = asyncio.Event()
+
+    async def runSource(source):
+        queue = asyncio.Queue(maxsize=queueSize)
+        if source.startswith('tcp://'):
+            host, port = source[len('tcp://'):].rsplit(':', 1)
+            reader = readSocket(host, int(port), queue, stopEvent=stopEvent)
+        else:
+            reader = tailFile(source, queue, pollInterval=pollInterval, stopEvent=stopEvent)
+        parser = asyncio.create_task(parseQueue(queue, sink, source, batchLines=batchLines, metrics=metrics))
+        readerTask = asyncio.create_task(reader)
+        stopTask = asyncio.create_task(stopEvent.wait())
+        try:
+            await asyncio.wait({readerTask, stopTask}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            readerTask.cancel()
+            stopTask.cancel()
+            await asyncio.gather(readerTask, stopTask, return_exceptions=True)
+            await queue.put(None) # publish the open batch
+            await parser
+        if not readerTask.cancelled() and readerTask.exception() is not None:
+            raise readerTask.exception()
+
+    await asyncio.gather(*(runSource(source) for source in sources))
+
+
+def main(argv=None):
+    args = argparse.ArgumentParser(description='Tail raw LECS logs/sockets and publish aligned batches')
+    args.add_argument('sources', nargs='+', help="raw log files or tcp://host:port")
+    args.add_argument('--store', required=True,
+                      help='Zarr (.zarr) or NetCDF store the aligned data is appended to, one per source (the source name is added to it)')
+    args.add_argument('--batch-lines', type=int, default=160)
+    args.add_argument('--queue-size', type=int, default=10000)
+    args.add_argument('--health', help='pickle of the HealthMonitor (S line telemetry summaries and alerts), kept across runs')
+    args = args.parse_args(argv)
+    sink = exportSink(args.store)
+    monitor = None
+    if args.health:
+        monitor = HealthMonitor.load(args.health) if os.path.exists(args.health) else HealthMonitor()
+        sink = healthSink(monitor, sink)
+    try:
+        asyncio.run(runIngest(args.sources, sink, batchLines=args.batch_lines,
+                              queueSize=args.queue_size))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if monitor is not None:
+            monitor.save(args.health)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+Per-stage instrumentation for the parsing pipeline.
+
+Pass a PipelineMetrics to parseDatabaseLines (metrics=...) to get wall time, rows in/out,
+dropped rows with the reason and throughput for each stage. With metrics=None (the default)
+nothing is measured.
+
+"""
+
+import threading
+import time
+import pandas as pd
+
+
+class StageMetrics:
+    """
+    Metrics for one stage of the pipeline
+
+    Attributes:
+        name (str): stage name (classify, D-parse, S-parse, align, filter)
+        seconds (float): wall time of the stage
+        rowsIn (int): rows (or lines) going into the stage
+        rowsOut (int): rows coming out of the stage
+        dropped (dict): number of dropped rows by reason
+    """
+
+    def __init__(self, name, rowsIn=0):
+        self.name = name
+        self.rowsIn = rowsIn
+        self.rowsOut = None
+        self.dropped = {}
+        self.seconds = None
+        self._t0 = time.perf_counter()
+
+    @property
+    def throughput(self):
+        """
+        rows in per second of wall time
+        """
+        if not self.seconds:
+            return None
+        return self.rowsIn / self.seconds
+
+    def asDict(self):
+        return dict(stage=self.name, seconds=self.seconds, rowsIn=self.rowsIn, rowsOut=self.rowsOut,
+                    dropped=sum(self.dropped.values()), dropReasons=dict(self.dropped),
+                    throughput=self.throughput)
+
+    def __repr__(self):
+        return 'StageMetrics(%s: %s -> %s rows in %.3f s, dropped %s)' % (
+            self.name, self.rowsIn, self.rowsOut, self.seconds or 0, self.dropped)
+
+
+class PipelineMetrics:
+    """
+    Collects StageMetrics for a pipeline run and optionally reports each finished stage to a callback.
+    Every thread times its own current stage, so one PipelineMetrics can be shared by pipelines running
+    in parallel (e.g. the sources of ingest.runIngest).
+
+    Args:
+        callback (callable, optional): called with each StageMetrics when the stage finishes. Defaults to None.
+
+    Example:
+        metrics = PipelineMetrics(callback=print)
+        data, slines = parseDatabaseLines(lines, metrics=metrics)
+        metrics.summary()
+    """
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.stages = []
+        self._local = threading.local() # current stage of every thread
+        self._lock = threading.Lock()
+
+    def start(self, name, rowsIn=0):
+        """
+        start timing a stage
+        """
+        self._local.current = StageMetrics(name, rowsIn)
+        return self._local.current
+
+    def finish(self, rowsOut, dropped=None):
+        """
+        stop timing the current stage and record its output
+
+        Args:
+            rowsOut (int): rows coming out of the stage
+            dropped (dict, optional): number of dropped rows by reason, zero counts are left out. Defaults to None.
+        """
+        stage = self._local.current
+        stage.seconds = time.perf_counter() - stage._t0
+        stage.rowsOut = rowsOut
+        if dropped is not None:
+            stage.dropped = {reason: int(n) for reason, n in dropped.items() if n}
+        with self._lock:
+            self.stages.append(stage)
+        self._local.current = None
+        if self.callback is not None:
+            self.callback(stage)
+        return stage
+
+    def __getitem__(self, name):
+        for stage in self.stages:
+            if stage.name == name:
+                return stage
+        raise KeyError(name)
+
+    def summary(self):
+        """
+        Returns:
+            pandas dataframe: one row per stage
+        """
+        return pd.DataFrame([stage.asDict() for stage in self.stages])
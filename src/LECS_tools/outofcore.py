@@ -0,0 +1,156 @@
+"""
+Out-of-core processing for deployments that don't fit in memory.
+
+The raw lines are streamed from disk and cut into chunks that each hold a bounded number of lines.
+Each chunk is parsed and aligned with parseDatabaseLines, QC'd, and the aligned rows are released
+(written out and used for the fluxes) once all the flux windows they fall in are complete.
+
+Boundaries are handled so the output matches processing the whole record in memory:
+- chunks are only cut at an S line that SlineParser keeps, and that S line is also appended to the
+  end of the previous chunk so the last segment of D lines before it is aligned the same way
+- aligned rows are held back until the S line time of the next chunk has passed the end of their
+  flux window, so every window is computed from the same rows as in memory
+  (rows with identical time stamps are ordered by line number)
+
+"""
+
+import numpy as np
+import pandas as pd
+
+from ._internalParserFuncsV2 import parseDatabaseLines, SlineParser
+from .flux import spectralECflux
+from .export import exportData
+
+
+def iterRawLines(paths):
+    """
+    Stream the lines of one or more raw LECS text files (in order)
+
+    Args:
+        paths (str or list): raw file path(s)
+
+    Yields:
+        str: raw lines without the newline
+    """
+    if isinstance(paths, str):
+        paths = [paths]
+    for path in paths:
+        with open(path, errors='replace') as fid:
+            for line in fid:
+                yield line.rstrip('\n')
+
+
+def _slineCut(line):
+    """
+    Check if a line is an S line that SlineParser keeps (so the chunk can be cut at it)
+
+    Returns:
+        tuple: (is a valid cut, ADV time of the S line or None)
+    """
+    l = line.strip()
+    if 'S:' not in l or 'D:' in l: # same classification as parseDatabaseLines
+        return False, None
+    try:
+        sLine = SlineParser([(0, l)])
+    except (ValueError, IndexError):
+        return False, None
+    if len(sLine) == 0:
+        return False, None
+    timeADV = sLine['timeADV'].iloc[0]
+    return True, pd.Timestamp(timeADV) # NaT if the ADV clock is in the future
+
+
+def iterChunks(lines, chunkLines=1000000):
+    """
+    Cut a stream of raw lines into chunks of at least chunkLines lines.
+    Chunks are cut at valid S lines, which end one chunk and start the next.
+
+    Args:
+        lines (iterable): raw lines
+        chunkLines (int, optional): minimum number of lines in a chunk. Defaults to 1000000 (about 16 hours of 16 Hz data).
+
+    Yields:
+        tuple: (list of lines, offset of the first line in the stream, ADV time of the closing S line or None for the last chunk)
+    """
+    chunk = []
+    offset = 0
+    for line in lines:
+        if len(chunk) >= chunkLines:
+            isCut, horizon = _slineCut(line)
+            if isCut:
+                chunk.append(line)
+                yield chunk, offset, horizon
+                offset += len(chunk) - 1
+                chunk = [line]
+                continue
+        chunk.append(line)
+    if chunk:
+        yield chunk, offset, None
+
+
+def processOutOfCore(lines, x1='w', x2='temp', chunkLines=1000000, qcFunc=None, dataPath=None,
+                     freq='60min', metrics=None, lowMemory=True, alignMethod='legacy', **fluxKwargs):
+    """
+    Parse, align, QC and compute the spectral fluxes of a deployment in bounded memory.
+
+    The result is the same as spectralECflux(qcFunc(parseDatabaseLines(allLines)[0]), x1, x2) but only
+    about one chunk of lines plus one flux window of aligned data is held in memory at a time.
+
+    Args:
+        lines (iterable): raw lines, e.g. iterRawLines(paths)
+        x1 (str, optional): first flux variable, None to skip the fluxes. Defaults to 'w'.
+        x2 (str, optional): second flux variable. Defaults to 'temp'.
+        chunkLines (int, optional): raw lines per chunk, sets the memory bound. Defaults to 1000000.
+        qcFunc (callable, optional): row-wise QC applied to each aligned chunk, takes and returns a dataframe. Defaults to None.
+        dataPath (str, optional): Zarr/NetCDF store the aligned (QC'd) data is written to, in time order. Defaults to None.
+        freq (str, optional): flux window spacing (must divide one day), see spectralECflux. Defaults to '60min'.
+        metrics (metrics.PipelineMetrics, optional): collects the per-stage metrics of every chunk. Defaults to None.
+        lowMemory (bool, optional): align each chunk with the vectorized alignTimeIndex instead of timeAlignmentV2
+            (see parseDatabaseLines). Defaults to True.
+        alignMethod (str, optional): 'legacy' or 'clock', see parseDatabaseLines. Defaults to 'legacy'.
+        **fluxKwargs: passed on to spectralECflux (fs, windowMinutes, high, low)
+
+    Returns:
+        tuple: fluxes, flux times (empty if x1 is None)
+    """
+    flux = []
+    fluxTimes = []
+    pending = None # aligned rows whose flux windows aren't complete yet
+    firstWrite = True
+
+    for chunk, offset, horizon in iterChunks(lines, chunkLines=chunkLines):
+        last = horizon is None
+        if any('D:' in l for l in chunk) and any('S:' in l for l in chunk):
+            parsed, _ = parseDatabaseLines(chunk, metrics=metrics, lowMemory=lowMemory, alignMethod=alignMethod)
+            parsed = parsed.set_axis(parsed.index + offset) # index by line number in the whole stream
+            if qcFunc is not None:
+                parsed = qcFunc(parsed)
+            pending = parsed if pending is None else pd.concat([pending, parsed])
+
+        if pending is None:
+            continue
+
+        # everything before the window holding the next chunk's first time stamp is complete
+        if last:
+            ready, pending = pending, None
+        elif pd.isna(horizon): # no usable time on the cut, keep holding
+            continue
+        else:
+            cut = horizon.floor(freq)
+            isReady = (pending['time'] < cut).to_numpy()
+            ready, pending = pending[isReady], pending[~isReady]
+        if len(ready) == 0:
+            continue
+        ready = ready.sort_index(kind='stable').sort_values(by='time', kind='stable') # ties in line order
+
+        if dataPath is not None:
+            exportData(ready, dataPath, append=not firstWrite, skipExisting=False)
+            firstWrite = False
+        if x1 is not None:
+            f, t = spectralECflux(ready, x1, x2, freq=freq, **fluxKwargs)
+            flux.append(f)
+            fluxTimes.append(t)
+
+    if len(flux) == 0:
+        return np.array([]), np.array([], dtype='datetime64[ns]')
+    return np.hstack(flux), np.hstack(fluxTimes)
@@ -0,0 +1,222 @@
+"""
+Multi-resolution aggregate pyramid of the aligned LECS data for quick-look plots.
+
+Each level holds per-bin sum, sum of squares, min, max and count of every variable, so
+levels can be built from the level below and new data can be merged into existing bins exactly.
+Mean, std, min, max and count are derived from these when queried.
+Every level is kept as a list of time ordered blocks, an update only rewrites the bins it touches at the
+tail and merges the last two blocks while the older one isn't bigger (so there are few blocks and each
+row is copied a logarithmic number of times instead of on every update).
+
+"""
+
+import pickle
+import numpy as np
+import pandas as pd
+
+LEVELS = ('1s', '1min', '10min', '1h')
+_STATS = ('sum', 'sumsq', 'min', 'max', 'count')
+
+
+def _reduceBins(binNs, stats):
+    """
+    Reduce sorted rows that share a bin into one row per bin
+
+    Args:
+        binNs (np.ndarray): int64 bin start (ns) of every row, sorted
+        stats (dict): stat name -> 2-D array (rows x variables)
+
+    Returns:
+        tuple: bin starts, dict of reduced 2-D arrays
+    """
+    starts = np.flatnonzero(np.r_[True, binNs[1:] != binNs[:-1]])
+    out = {
+        'sum': np.add.reduceat(stats['sum'], starts, axis=0),
+        'sumsq': np.add.reduceat(stats['sumsq'], starts, axis=0),
+        'min': np.fmin.reduceat(stats['min'], starts, axis=0),
+        'max': np.fmax.reduceat(stats['max'], starts, axis=0),
+        'count': np.add.reduceat(stats['count'], starts, axis=0),
+    }
+    return binNs[starts], out
+
+
+def _toFrame(bins, stats, variables):
+    columns = pd.MultiIndex.from_product([_STATS, variables], names=['stat', 'variable'])
+    values = np.hstack([stats[s].astype(float) for s in _STATS])
+    return pd.DataFrame(values, index=pd.DatetimeIndex(bins.astype('datetime64[ns]'), name='time'), columns=columns)
+
+
+def _fromFrame(frame):
+    return {s: frame[s].to_numpy() for s in _STATS}
+
+
+class Pyramid:
+    """
+    Precomputed mean/std/min/max/count of the aligned data at several resolutions (1 s, 1 min, 10 min, 1 h by default)
+
+    Args:
+        variables (list): columns of the aligned data to aggregate
+        levels (tuple, optional): bin sizes from fine to coarse, each a multiple of the one before. Defaults to LEVELS.
+
+    Example:
+        pyr = Pyramid(['u', 'v', 'w', 'temp'])
+        pyr.update(parsedDataframe)          # repeat as new data is aligned
+        quickLook = pyr.query('2023-06-01', '2023-07-01', maxPoints=5000)
+    """
+
+    def __init__(self, variables, levels=LEVELS):
+        self.variables = list(variables)
+        self.levels = tuple(levels)
+        self.binNs = [pd.Timedelta(level).value for level in self.levels]
+        self.offset = None # per variable reference value, keeps the sums of squares well conditioned
+        self.blocks = {level: [] for level in self.levels}
+        self._joined = {} # whole level frames for queries, dropped when the level changes
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_joined'] = {}
+        return state
+
+    def __setstate__(self, state):
+        if 'data' in state: # pickled with one frame per level
+            state['blocks'] = {level: [] if frame is None else [frame] for level, frame in state.pop('data').items()}
+        state.setdefault('_joined', {})
+        self.__dict__.update(state)
+
+    def _level(self, level):
+        """
+        all the bins of a level as one frame (None if empty)
+        """
+        if level not in self._joined:
+            blocks = self.blocks[level]
+            self._joined[level] = pd.concat(blocks) if len(blocks) > 1 else (blocks[0] if blocks else None)
+        return self._joined[level]
+
+    def _aggregate(self, df):
+        """
+        one partial pyramid (dict of level frames) from a chunk of aligned data
+        """
+        time = pd.to_datetime(df['time']).to_numpy(dtype='datetime64[ns]')
+        valid = ~np.isnat(time)
+        values = df[self.variables].to_numpy(dtype=float)[valid]
+        tNs = time[valid].astype(np.int64)
+        order = np.argsort(tNs, kind='stable')
+        tNs, values = tNs[order], values[order]
+        if self.offset is None:
+            self.offset = np.nan_to_num(np.nanmean(values[:1000], axis=0)) if len(values) else np.zeros(len(self.variables))
+        values = values - self.offset
+
+        finite = np.isfinite(values)
+        zeroed = np.where(finite, values, 0.0)
+        stats = {'sum': zeroed, 'sumsq': zeroed * zeroed, 'min': values, 'max': values,
+                 'count': finite.astype(np.int64)}
+
+        partial = {}
+        binsNs = tNs
+        for level, step in zip(self.levels, self.binNs):
+            bins, stats = _reduceBins(binsNs - binsNs % step, stats)
+            partial[level] = _toFrame(bins, stats, self.variables)
+            binsNs = bins
+        return partial
+
+    def update(self, df):
+        """
+        Merge newly aligned data into the pyramid. Only the bins that the new data touches are recombined.
+
+        Args:
+            df (pandas dataframe): aligned data with a time column (e.g. output of parseDatabaseLines)
+
+        Returns:
+            Pyramid: self
+        """
+        if len(df) == 0:
+            return self
+        partial = self._aggregate(df)
+        for level in self.levels:
+            new = partial[level]
+            if len(new) == 0:
+                continue
+            blocks = self.blocks[level]
+            # blocks with bins at or after the first new bin (usually just the open bin of the last block)
+            k = len(blocks)
+            while k > 0 and blocks[k - 1].index[-1] >= new.index[0]:
+                k -= 1
+            overlap = [new]
+            if k < len(blocks):
+                split = blocks[k].index.searchsorted(new.index[0])
+                head = blocks[k].iloc[:split]
+                overlap = [blocks[k].iloc[split:]] + blocks[k + 1:] + overlap
+                del blocks[k:]
+                if len(head):
+                    blocks.append(head)
+            combined = pd.concat(overlap).sort_index(kind='stable') if len(overlap) > 1 else new
+            bins, stats = _reduceBins(combined.index.to_numpy().astype(np.int64), _fromFrame(combined))
+            blocks.append(_toFrame(bins, stats, self.variables))
+            while len(blocks) > 1 and len(blocks[-2]) <= len(blocks[-1]):
+                blocks[-2:] = [pd.concat(blocks[-2:])]
+            self._joined.pop(level, None)
+        return self
+
+    def stats(self, level, start=None, end=None):
+        """
+        Mean, std, min, max and count per variable for one level
+
+        Args:
+            level (str): one of self.levels
+            start (datetime like, optional): first bin. Defaults to None.
+            end (datetime like, optional): last bin. Defaults to None.
+
+        Returns:
+            pandas dataframe: columns (variable, stat) indexed by bin start time
+        """
+        frame = self._level(level)
+        if frame is None:
+            return pd.DataFrame()
+        frame = frame.loc[start:end]
+        s = _fromFrame(frame)
+        n = s['count']
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = s['sum'] / n
+            var = (s['sumsq'] - s['sum'] * mean) / (n - 1)
+        out = {
+            'mean': mean + self.offset,
+            'std': np.sqrt(np.clip(var, 0, None)),
+            'min': s['min'] + self.offset,
+            'max': s['max'] + self.offset,
+            'count': n,
+        }
+        columns = pd.MultiIndex.from_product([self.variables, list(out)], names=['variable', 'stat'])
+        values = np.stack([out[stat] for stat in out], axis=2).reshape(len(frame), -1)
+        return pd.DataFrame(values, index=frame.index, columns=columns)
+
+    def query(self, start=None, end=None, maxPoints=5000):
+        """
+        Stats of the finest level that has at most maxPoints bins between start and end
+
+        Args:
+            start (datetime like, optional): start of the plot. Defaults to None.
+            end (datetime like, optional): end of the plot. Defaults to None.
+            maxPoints (int, optional): most bins to return. Defaults to 5000.
+
+        Returns:
+            pandas dataframe: see stats
+        """
+        for level in self.levels:
+            frame = self._level(level)
+            if frame is None:
+                continue
+            if len(frame.loc[start:end]) <= maxPoints:
+                return self.stats(level, start, end)
+        return self.stats(self.levels[-1], start, end)
+
+    def save(self, path):
+        """
+        pickle the pyramid so it can be updated by later runs
+        """
+        with open(path, 'wb') as fid:
+            pickle.dump(self, fid)
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as fid:
+            return pickle.load(fid)
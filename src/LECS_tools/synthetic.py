@@ -0,0 +1,205 @@
+"""
+Synthetic raw LECS data for testing and benchmarking without hitting the live site.
+
+The streams mimic the layout parsed by parseDatabaseLines: one S line (status line with the
+system and ADV clocks) per second followed by the 16 Hz D lines (data lines) of that second,
+with optional $ (gps) lines, junk lines, corrupted lines and dropped samples.
+
+"""
+
+import datetime as dt
+import numpy as np
+import pandas as pd
+
+
+def _nmeaChecksum(body):
+    """
+    XOR of all characters between the $ and the * of an NMEA sentence
+    """
+    cs = 0
+    for ch in body.encode('ascii'):
+        cs ^= ch
+    return '%02X' % cs
+
+
+def _nmeaLatLon(lat, lon):
+    """
+    format decimal degrees as NMEA ddmm.mmmm,N,dddmm.mmmm,W fields
+    """
+    latDeg = int(abs(lat))
+    lonDeg = int(abs(lon))
+    latMin = (abs(lat) - latDeg) * 60
+    lonMin = (abs(lon) - lonDeg) * 60
+    return '%02d%07.4f,%s,%03d%07.4f,%s' % (latDeg, latMin, 'N' if lat >= 0 else 'S',
+                                           lonDeg, lonMin, 'E' if lon >= 0 else 'W')
+
+
+def gpsLine(time, lat=41.5247, lon=-70.6714, sentence='GPRMC', badChecksum=False):
+    """
+    Build one NMEA gps line as logged on the LECS ($GPRMC or $GPGGA)
+
+    Args:
+        time (datetime like): utc time of the fix
+        lat (float, optional): latitude in decimal degrees. Defaults to 41.5247 (WHOI).
+        lon (float, optional): longitude in decimal degrees. Defaults to -70.6714 (WHOI).
+        sentence (str, optional): 'GPRMC' or 'GPGGA'. Defaults to 'GPRMC'.
+        badChecksum (bool, optional): write a wrong checksum (corrupted line). Defaults to False.
+
+    Returns:
+        str: the $ line
+    """
+    time = pd.Timestamp(time)
+    hhmmss = time.strftime('%H%M%S') + '.%02d' % (time.microsecond // 10000)
+    if sentence == 'GPRMC':
+        body = 'GPRMC,%s,A,%s,0.02,0.00,%s,,,A' % (hhmmss, _nmeaLatLon(lat, lon), time.strftime('%d%m%y'))
+    elif sentence == 'GPGGA':
+        body = 'GPGGA,%s,%s,1,09,0.9,2.1,M,-32.9,M,,' % (hhmmss, _nmeaLatLon(lat, lon))
+    else:
+        raise ValueError('sentence must be GPRMC or GPGGA')
+    cs = _nmeaChecksum(body)
+    if badChecksum:
+        cs = '%02X' % (int(cs, 16) ^ 0xFF)
+    return '$' + body + '*' + cs
+
+
+def slineText(time, timeADV, batteryVoltage=12.1, soundSpeed=1500.0, heading=0.0, pitch=0.0, roll=0.0, temp2=15.0):
+    """
+    Build one S line in the field order of slineKey (system clock first, then the ADV clock)
+
+    Returns:
+        str: the S line
+    """
+    time = pd.Timestamp(time)
+    timeADV = pd.Timestamp(timeADV)
+    return 'S:%d,%d,%d,%d,%d,%d,%d,%d,%d,%d,%d,%d,%.1f,%.1f,%.1f,%.1f,%.1f,%.2f' % (
+        time.hour, time.minute, time.second, time.day, time.month, time.year,
+        timeADV.minute, timeADV.second, timeADV.day, timeADV.hour, timeADV.year - 2000, timeADV.month,
+        batteryVoltage, soundSpeed, heading, pitch, roll, temp2)
+
+
+def generateRawLines(durationSeconds=3600,
+                     start='2023-06-01 00:00:00',
+                     samplingFrequencyHz=16,
+                     gpsIntervalSeconds=1,
+                     junkFraction=0.0,
+                     corruptFraction=0.0,
+                     dropFraction=0.0,
+                     countStart=0,
+                     driftPPM=0.0,
+                     chunkSeconds=3600,
+                     seed=None):
+    """
+    Generate a realistic raw LECS stream one line at a time.
+    Every second has an S line followed by the D lines of that second and (optionally) a $ line.
+    The D line count is an 8 bit counter that rolls over at 256.
+
+    Args:
+        durationSeconds (int, optional): length of the record. Defaults to 3600.
+        start (str, optional): time of the first sample (SlineParser only keeps 2022-2024). Defaults to '2023-06-01 00:00:00'.
+        samplingFrequencyHz (int, optional): D line rate. Defaults to 16.
+        gpsIntervalSeconds (int, optional): seconds between $ lines, None for no gps. Defaults to 1.
+        junkFraction (float, optional): fraction of extra unclassified lines (blank/met/garbage). Defaults to 0.0.
+        corruptFraction (float, optional): fraction of D lines that are truncated or have a bad count, and of $ lines with bad checksums. Defaults to 0.0.
+        dropFraction (float, optional): fraction of D samples that are missing (leaves gaps in the count). Defaults to 0.0.
+        countStart (int, optional): count of the first sample, sets where the rollovers fall. Defaults to 0.
+        driftPPM (float, optional): sample clock drift relative to the ADV clock in parts per million. Defaults to 0.0.
+        chunkSeconds (int, optional): seconds of data generated per internal block. Defaults to 3600.
+        seed (int, optional): random seed. Defaults to None.
+
+    Yields:
+        str: raw data lines (no newline)
+    """
+    rng = np.random.default_rng(seed)
+    t0 = pd.Timestamp(start)
+    fs = samplingFrequencyHz
+    dtSample = (1 + driftPPM * 1e-6) / fs # seconds of ADV clock per sample
+    gpsNo = 0
+
+    for chunkStart in range(0, int(durationSeconds), int(chunkSeconds)):
+        nSec = min(int(chunkSeconds), int(durationSeconds) - chunkStart)
+
+        # samples that fall in this block of seconds
+        firstSample = int(np.ceil(chunkStart / dtSample - 1e-9))
+        lastSample = int(np.ceil((chunkStart + nSec) / dtSample - 1e-9))
+        k = np.arange(firstSample, lastSample)
+        n = k.shape[0]
+        tSec = k * dtSample
+        second = np.floor(tSec + 1e-9).astype(np.int64) - chunkStart
+
+        # physical signals: tide, surface waves and a w'T' correlation so the flux is non zero
+        wave = np.sin(2 * np.pi * tSec / 8.0)
+        turb = rng.normal(0, 1, n)
+        pressure = 10000 + 500 * np.sin(2 * np.pi * tSec / 44712.0) + 150 * wave + rng.normal(0, 2, n)
+        u = 50 + 200 * wave + 30 * rng.normal(0, 1, n)
+        v = -20 + 80 * np.cos(2 * np.pi * tSec / 8.0) + 30 * rng.normal(0, 1, n)
+        w = 15 * wave + 10 * turb
+        tempVolt = 1.5 + 0.05 * np.sin(2 * np.pi * tSec / 86400.0) + 0.002 * turb + rng.normal(0, 0.0005, n)
+        doVolt = 1.8 + 0.0005 * turb + rng.normal(0, 0.0005, n)
+        amps = rng.integers(100, 160, (n, 3))
+        corrs = rng.integers(80, 101, (n, 3))
+        phVolt = 2.1 + rng.normal(0, 0.001, n)
+        count = (countStart + k) % 256
+
+        keep = rng.random(n) >= dropFraction
+        corrupt = rng.random(n) < corruptFraction
+
+        rows = np.column_stack([u, v, w]).round().astype(np.int64).tolist()
+        dlines = []
+        for i in range(n):
+            if not keep[i]:
+                dlines.append(None)
+                continue
+            line = 'D:%d,%.0f,%d,%d,%d,%d,%d,%d,%d,%d,%d,0,0,%.4f,%.4f,%.4f' % (
+                count[i], pressure[i], rows[i][0], rows[i][1], rows[i][2],
+                amps[i, 0], amps[i, 1], amps[i, 2], corrs[i, 0], corrs[i, 1], corrs[i, 2],
+                phVolt[i], tempVolt[i], doVolt[i])
+            if corrupt[i]:
+                if rng.random() < 0.5:
+                    line = line[:int(rng.integers(3, len(line) - 1))] # truncated transmission
+                else:
+                    line = 'D:%d' % rng.integers(256, 1000) + line[line.index(','):] # bad count
+            elif rng.random() < 0.01:
+                line = line + '.' # the logger sometimes leaves a trailing period
+            dlines.append(line)
+
+        bounds = np.searchsorted(second, np.arange(nSec + 1))
+        for s in range(nSec):
+            absSec = chunkStart + s
+            time = t0 + dt.timedelta(seconds=absSec)
+            yield slineText(time, time,
+                            batteryVoltage=12.6 - 1e-6 * absSec + rng.normal(0, 0.01),
+                            soundSpeed=1500.0 + rng.normal(0, 0.1),
+                            heading=180.0 + rng.normal(0, 0.5),
+                            pitch=1.0 + rng.normal(0, 0.2),
+                            roll=-0.5 + rng.normal(0, 0.2),
+                            temp2=15.0 + rng.normal(0, 0.01))
+            for i in range(bounds[s], bounds[s + 1]):
+                if dlines[i] is not None:
+                    yield dlines[i]
+                if junkFraction and rng.random() < junkFraction:
+                    yield ['', 'M:', '#ADV RESET', 'garbled\x00line'][int(rng.integers(0, 4))]
+            if gpsIntervalSeconds and absSec % gpsIntervalSeconds == 0:
+                sentence = 'GPRMC' if gpsNo % 2 == 0 else 'GPGGA'
+                yield gpsLine(time, sentence=sentence, badChecksum=bool(corruptFraction and rng.random() < corruptFraction))
+                gpsNo += 1
+
+
+
+def writeRawFile(path, **kwargs):
+    """
+    Write a synthetic raw LECS stream to a text file (one line per row)
+
+    Args:
+        path (str): output file
+        **kwargs: passed on to generateRawLines
+
+    Returns:
+        int: number of lines written
+    """
+    nLines = 0
+    with open(path, 'w') as fid:
+        for line in generateRawLines(**kwargs):
+            fid.write(line)
+            fid.write('\n')
+            nLines += 1
+    return nLines
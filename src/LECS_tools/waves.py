@@ -0,0 +1,185 @@
+"""
+Wave statistics from the 16 Hz pressure and velocity of the ADV.
+
+Every window of a WindowIndex (the same windows as spectralECflux) is cut into half overlapping segments,
+the segments of all windows are stacked and transformed together (rfft in batches of segments), and the segment spectra are averaged
+back per window (Welch). The pressure spectrum is converted to surface elevation with linear wave theory
+(dispersion relation solved for every window depth), which gives the significant wave height and periods,
+and the share of the pressure/velocity variance in the wave band flags windows where wave orbital motion
+dominates (and would contaminate the fluxes).
+
+"""
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from .windows import windowIndexFor
+
+
+def waveNumber(omega, depth, g=9.81, iterations=4):
+    """
+    Solve the linear dispersion relation omega^2 = g k tanh(k depth) for k (vectorized, Newton iterations)
+
+    Args:
+        omega (np.ndarray): radian frequency
+        depth (np.ndarray): water depth in m (broadcast against omega)
+        g (float, optional): gravity. Defaults to 9.81.
+        iterations (int, optional): Newton steps after the explicit first guess. Defaults to 4.
+
+    Returns:
+        np.ndarray: wave number in rad/m
+    """
+    omega, depth = np.broadcast_arrays(np.asarray(omega, dtype=float), np.asarray(depth, dtype=float))
+    kDeep = omega**2 / g
+    with np.errstate(invalid='ignore', divide='ignore'):
+        k = kDeep / np.sqrt(np.tanh(kDeep * depth)) # Eckart style guess, exact in deep and shallow limits
+        for _ in range(iterations):
+            th = np.tanh(k * depth)
+            f = g * k * th - omega**2
+            df = g * th + g * k * depth * (1 - th**2)
+            k = k - f / df
+    return np.where(omega > 0, k, 0.0)
+
+
+def pressureResponse(k, depth, sensorHeight=0.0):
+    """
+    pressure response factor cosh(k z)/cosh(k depth) of a sensor z above the bed (overflow safe form)
+    """
+    z = np.clip(sensorHeight, 0, depth)
+    return np.exp(k * (z - depth)) * (1 + np.exp(-2 * k * z)) / (1 + np.exp(-2 * k * depth))
+
+
+def waveStatistics(df, freq='60min', windowIndex=None, fs=16, segmentSeconds=256, minLength=None,
+                   pressure='pressure', velocity=('u', 'v'), sensorHeight=0.0, pressureScale=0.001,
+                   rho=1025.0, g=9.81, fLow=0.05, fHigh=0.5, minResponse=0.1, batchSegments=None,
+                   batchBytes=64e6, returnSpectra=False):
+    """
+    Significant wave height, periods and wave band variance fractions for every window
+
+    Args:
+        df (pandas dataframe): aligned data with a time column (output of parseDatabaseLines)
+        freq (str, optional): window length. Defaults to '60min'.
+        windowIndex (windows.WindowIndex, optional): window index of df['time'] to reuse (its freq is used),
+            ValueError if it was built for other data. Defaults to None.
+        fs (int, optional): sampling frequency. Defaults to 16.
+        segmentSeconds (int, optional): Welch segment length. Defaults to 256.
+        minLength (int, optional): skip windows with this many samples or fewer.
+            Defaults to None (30 minutes of data, the spectralECflux default).
+        pressure (str, optional): pressure column. Defaults to 'pressure'.
+        velocity (tuple, optional): horizontal velocity columns. Defaults to ('u', 'v').
+        sensorHeight (float, optional): pressure sensor height above the bed in m. Defaults to 0.0.
+        pressureScale (float, optional): dbar per pressure unit. Defaults to 0.001.
+        rho (float, optional): sea water density. Defaults to 1025.0.
+        g (float, optional): gravity. Defaults to 9.81.
+        fLow (float, optional): low end of the wave band in Hz. Defaults to 0.05.
+        fHigh (float, optional): high end of the wave band in Hz. Defaults to 0.5.
+        minResponse (float, optional): frequencies where the pressure response is weaker than this are left out
+            of the elevation spectrum (noise would be amplified). Defaults to 0.1.
+        batchSegments (int, optional): segments per rfft call. Defaults to None (as many as fit in batchBytes).
+        batchBytes (float, optional): scratch memory of one batch (segments, tapered copy and spectra). Defaults to 64e6.
+        returnSpectra (bool, optional): also return the elevation spectra. Defaults to False.
+
+    Returns:
+        pandas dataframe: per window (indexed by the mean time like spectralECflux) depth, Hs, Tp, Tm01,
+            pressureWaveFraction, velocityWaveFraction and nSegments
+        spectra: (only with returnSpectra) xarray dataset with the time x frequency elevation spectrum 'S_eta'
+    """
+    windowIndex = windowIndexFor(df['time'], freq=freq, windowIndex=windowIndex)
+    if minLength is None:
+        minLength = 30 * 60 * fs
+    nperseg = int(segmentSeconds * fs)
+    hop = nperseg // 2
+    columns = [pressure] + list(velocity)
+    values = np.column_stack([df[c].to_numpy(dtype=float) for c in columns])
+    if windowIndex.order is not None:
+        values = values[windowIndex.order]
+
+    # segments of every window, as start positions in the time ordered rows
+    windows = np.flatnonzero((windowIndex.lengths > minLength) & (windowIndex.lengths >= nperseg))
+    nSeg = (windowIndex.lengths[windows] - nperseg) // hop + 1
+    segWindow = np.repeat(np.arange(len(windows)), nSeg)
+    segStart = np.repeat(windowIndex.starts[windows], nSeg) + hop * (np.arange(nSeg.sum()) - np.repeat(np.cumsum(nSeg) - nSeg, nSeg))
+
+    # rfft of the stacked segments of all windows (segments with missing data are left out),
+    # summed into the windows they belong to
+    f = np.fft.rfftfreq(nperseg, 1 / fs)
+    taper = np.hanning(nperseg)
+    nWin = len(windows)
+    if batchSegments is None:
+        segmentBytes = 8 * nperseg * len(columns) * 5 # gathered, centred and tapered segments, rfft and power
+        batchSegments = max(int(batchBytes // segmentBytes), 1)
+    count = np.zeros(nWin, dtype=np.int64)
+    psd = np.zeros((nWin, len(f), len(columns)))
+    meanLevel = np.zeros((nWin, len(columns)))
+    for b in range(0, len(segStart), batchSegments):
+        segments = values[segStart[b:b + batchSegments, None] + np.arange(nperseg)] # segment x sample x variable
+        good = np.isfinite(segments).all(axis=(1, 2))
+        segments, win = segments[good], segWindow[b:b + batchSegments][good]
+        segMean = segments.mean(axis=1)
+        spectra = np.fft.rfft((segments - segMean[:, None, :]) * taper[None, :, None], axis=1)
+        np.add.at(psd, win, np.abs(spectra)**2 * 2 / (fs * np.sum(taper**2))) # one sided psd
+        np.add.at(meanLevel, win, segMean)
+        count += np.bincount(win, minlength=nWin)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        psd /= count[:, None, None]
+        meanLevel /= count[:, None]
+
+    # pressure -> surface elevation through the dispersion relation at each window's depth
+    toMeters = pressureScale * 1e4 / (rho * g)
+    depth = meanLevel[:, 0] * toMeters + sensorHeight
+    k = waveNumber(2 * np.pi * f[None, :], depth[:, None], g=g)
+    response = pressureResponse(k, depth[:, None], sensorHeight)
+    band = (f >= fLow) & (f <= fHigh)
+    usable = band[None, :] & (response >= minResponse)
+    with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+        sEta = np.where(usable, psd[:, :, 0] * toMeters**2 / response**2, 0.0)
+
+    df_ = f[1] - f[0]
+    m0 = sEta.sum(axis=1) * df_
+    m1 = (sEta * f[None, :]).sum(axis=1) * df_
+    peak = np.argmax(sEta, axis=1)
+    valid = (count > 0) & (m0 > 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        total = psd[:, 1:, :].sum(axis=1) # variance without the mean
+        inBand = psd[:, band, :].sum(axis=1)
+        pressureFraction = inBand[:, 0] / total[:, 0]
+        velocityFraction = inBand[:, 1:].sum(axis=1) / total[:, 1:].sum(axis=1)
+        stats = pd.DataFrame({
+            'depth': depth,
+            'Hs': np.where(valid, 4 * np.sqrt(m0), np.nan),
+            'Tp': np.where(valid, 1 / f[peak], np.nan),
+            'Tm01': np.where(valid, m0 / m1, np.nan),
+            'pressureWaveFraction': pressureFraction,
+            'velocityWaveFraction': velocityFraction,
+            'nSegments': count,
+        }, index=pd.DatetimeIndex([windowIndex.meanTime(k) for k in windows], name='time'))
+
+    if not returnSpectra:
+        return stats
+    spectraDataset = xr.Dataset(
+        {'S_eta': (('time', 'frequency'), np.where(usable, sEta, np.nan).astype(np.float32))},
+        coords={'time': stats.index.to_numpy(dtype='datetime64[ns]'), 'frequency': f},
+        attrs={'fs': fs, 'freq': windowIndex.freq, 'segmentSeconds': segmentSeconds, 'units': 'm^2/Hz'},
+    )
+    return stats, spectraDataset
+
+
+def waveDominated(stats, fluxTimes=None, threshold=0.5, variable='velocityWaveFraction'):
+    """
+    Flag windows where the wave band holds more than threshold of the variance
+
+    Args:
+        stats (pandas dataframe): output of waveStatistics
+        fluxTimes (np.ndarray, optional): flux time stamps (spectralECflux) to return the mask for,
+            times without wave statistics are not flagged. Defaults to None (one flag per stats row).
+        threshold (float, optional): wave variance fraction above which a window is wave dominated. Defaults to 0.5.
+        variable (str, optional): 'velocityWaveFraction' or 'pressureWaveFraction'. Defaults to 'velocityWaveFraction'.
+
+    Returns:
+        np.ndarray: boolean mask
+    """
+    flag = (stats[variable] > threshold).to_numpy()
+    if fluxTimes is None:
+        return flag
+    return pd.Series(flag, index=stats.index).reindex(pd.DatetimeIndex(fluxTimes), fill_value=False).to_numpy(dtype=bool)
@@ -0,0 +1,120 @@
+"""
+Reusable time window index for the flux and statistics functions.
+
+The index is built once from the time array with binary search and gives the start/stop of every
+window, so any function can take each window as array slices (views when the time is sorted)
+instead of re-grouping and copying the dataframe on every call.
+Windows follow pd.Grouper(freq=..., key='time') with its default origin ('start_day').
+
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class WindowIndex:
+    """
+    Start/stop positions of fixed length time windows
+
+    Args:
+        time (array like): sample times (sorted for zero-copy slices, NaT allowed)
+        freq (str, optional): window length. Defaults to '60min'.
+
+    Example:
+        idx = WindowIndex(df['time'], freq='60min')
+        w, T = df['w'].to_numpy(), df['temp'].to_numpy()
+        for k, wk, Tk in idx.windows(w, T, minLength=28800):
+            ...
+    """
+
+    def __init__(self, time, freq='60min'):
+        tNs = pd.to_datetime(np.asarray(time)).to_numpy(dtype='datetime64[ns]').astype(np.int64)
+        valid = tNs != np.iinfo(np.int64).min # NaT
+        self.freq = freq
+        self.n = len(tNs)
+
+        # sorted (NaT only at the end, like sort_values output) -> plain slices, otherwise through a sort order
+        nValid = int(valid.sum())
+        tValid = tNs[:nValid]
+        if valid[:nValid].all() and np.all(tValid[1:] >= tValid[:-1]):
+            self.order = None
+        else:
+            self.order = np.flatnonzero(valid)
+            self.order = self.order[np.argsort(tNs[self.order], kind='stable')]
+            tValid = tNs[self.order]
+
+        step = pd.Timedelta(freq).value
+        if nValid == 0:
+            self.starts = self.stops = np.array([], dtype=np.int64)
+            self.binStarts = np.array([], dtype='datetime64[ns]')
+            self._tValid = tValid
+            return
+        origin = pd.Timestamp(tValid[0]).floor('D').value
+        first = (tValid[0] - origin) // step
+        last = (tValid[-1] - origin) // step
+        edges = origin + np.arange(first, last + 2) * step
+        bounds = np.searchsorted(tValid, edges, side='left')
+        self.starts = bounds[:-1]
+        self.stops = bounds[1:]
+        self.binStarts = edges[:-1].astype('datetime64[ns]')
+        self._tValid = tValid
+
+    def __len__(self):
+        return len(self.starts)
+
+    @property
+    def lengths(self):
+        return self.stops - self.starts
+
+    def take(self, k, arr):
+        """
+        samples of window k from an array aligned with the time array (a view if the time is sorted)
+        """
+        if self.order is None:
+            return arr[self.starts[k]:self.stops[k]]
+        return arr[self.order[self.starts[k]:self.stops[k]]]
+
+    def meanTime(self, k):
+        """
+        mean time of the samples in window k
+        """
+        t = self._tValid[self.starts[k]:self.stops[k]]
+        if len(t) == 0:
+            return pd.NaT
+        return pd.Timestamp(t[0] + int(round(np.mean(t - t[0]))))
+
+    def windows(self, *arrays, minLength=0):
+        """
+        Iterate over the windows with more than minLength samples
+
+        Args:
+            *arrays (np.ndarray): arrays aligned with the time array
+            minLength (int, optional): skip windows with this many samples or fewer. Defaults to 0.
+
+        Yields:
+            tuple: window number followed by the slice of each array
+        """
+        for k in np.flatnonzero(self.lengths > minLength):
+            yield (k,) + tuple(self.take(k, arr) for arr in arrays)
+
+
+def windowIndexFor(time, freq='60min', windowIndex=None):
+    """
+    Window index of a time array: windowIndex if one is passed in, otherwise a new one
+
+    Args:
+        time (array like): sample times, e.g. df['time']
+        freq (str, optional): window length of a new index. Defaults to '60min'.
+        windowIndex (WindowIndex, optional): index to reuse. Defaults to None.
+
+    Raises:
+        ValueError: if windowIndex was built for a time array of another length (a stale index would slice the wrong rows)
+
+    Returns:
+        WindowIndex
+    """
+    if windowIndex is None:
+        return WindowIndex(time, freq=freq)
+    if windowIndex.n != len(time):
+        raise ValueError('windowIndex was built for %d samples, the data has %d' % (windowIndex.n, len(time)))
+    return windowIndex
@@ -0,0 +1,58 @@
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from LECS_tools._internalParserFuncsV2 import (DlineParser, SlineParser, alignTimeIndex, parseDatabaseLines,
+                                               timeAlignmentV2)
+from LECS_tools.synthetic import generateRawLines
+
+
+def rawLines(seconds=600, seed=0, **kwargs):
+    return list(generateRawLines(seconds, seed=seed, gpsIntervalSeconds=None, **kwargs))
+
+
+def split(lines):
+    dlines = [(i, l.strip()) for i, l in enumerate(lines) if 'D:' in l]
+    slines = [(i, l.strip()) for i, l in enumerate(lines) if 'S:' in l and 'D:' not in l]
+    return DlineParser(dlines), SlineParser(slines)
+
+
+@pytest.mark.parametrize('kwargs', [
+    dict(seed=1),
+    dict(seed=2, dropFraction=0.02, countStart=250),
+    dict(seed=3, corruptFraction=0.01, dropFraction=0.005, junkFraction=0.005),
+])
+def test_align_time_index_matches_time_alignment_v2(kwargs):
+    data, sLines = split(rawLines(**kwargs))
+    legacy = timeAlignmentV2(data.copy(), sLines)
+    time, order = alignTimeIndex(data, sLines)
+    expected = legacy['time'].reindex(data.index).to_numpy(dtype='datetime64[ns]')
+    np.testing.assert_array_equal(time, expected)
+    assert sorted(order) == list(np.flatnonzero(~np.isnat(expected)))
+    assert np.all(np.diff(time[order]) >= np.timedelta64(0))
+
+
+def test_low_memory_parse_matches_default():
+    lines = rawLines(seed=4, corruptFraction=0.005, dropFraction=0.005, junkFraction=0.005)
+    default, _ = parseDatabaseLines(lines)
+    low, _ = parseDatabaseLines(lines, lowMemory=True)
+    default, low = default.sort_index(), low.sort_index()
+    pd.testing.assert_index_equal(low.index, default.index)
+    np.testing.assert_array_equal(low['time'].to_numpy(dtype='datetime64[ns]'),
+                                  default['time'].to_numpy(dtype='datetime64[ns]'))
+    np.testing.assert_allclose(low[['w', 'temp', 'DO_percent']].to_numpy(float),
+                               default[['w', 'temp', 'DO_percent']].to_numpy(float))
+
+
+def test_memory_budget_bounds_the_peak():
+    lines = rawLines(3600, seed=5, corruptFraction=0.001)
+    with pytest.raises(MemoryError):
+        parseDatabaseLines(lines, memoryBudget=1e6)
+    budget = 30e6
+    tracemalloc.start()
+    parsed, _ = parseDatabaseLines(lines, memoryBudget=budget)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert len(parsed) > 0.99 * 3600 * 16 and peak < budget
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from LECS_tools._internalParserFuncsV2 import parseDatabaseLines
+from LECS_tools.archive import writeArchive, iterArchive, readArchive, loadArchiveIndex
+from LECS_tools.outofcore import _slineCut
+from LECS_tools.synthetic import generateRawLines
+
+
+@pytest.fixture(scope='module')
+def lines():
+    return list(generateRawLines(2400, start='2023-06-01 01:00:00', junkFraction=0.01, corruptFraction=0.01, seed=8))
+
+
+def rowsBetween(lines, start, end):
+    parsed, _ = parseDatabaseLines(lines, lowMemory=True)
+    parsed = parsed[(parsed['time'] >= pd.Timestamp(start)) & (parsed['time'] < pd.Timestamp(end))]
+    return parsed[['time', 'count', 'u', 'w']].reset_index(drop=True)
+
+
+def assertCutAtSlines(path):
+    index = loadArchiveIndex(path)
+    blocks = [readArchive(path, t, t) for t in index['firstTime'].iloc[1:]]
+    assert all(_slineCut(block[0])[0] for block in blocks)
+    assert (np.diff(index['firstLine']) == index['nLines'].iloc[:-1]).all()
+
+
+def test_round_trip(tmp_path, lines):
+    path = str(tmp_path / 'raw.lecsz')
+    assert writeArchive(iter(lines), path, blockLines=4096) > 5
+    assert list(iterArchive(path)) == lines
+    assertCutAtSlines(path)
+
+
+def test_range_read_parses_like_the_log(tmp_path, lines):
+    path = str(tmp_path / 'raw.lecsz')
+    writeArchive(lines, path, blockLines=4096)
+    start, end = '2023-06-01 01:12:00', '2023-06-01 01:23:30'
+    ranged = readArchive(path, start, end)
+    assert len(ranged) < len(lines) / 2
+    pd.testing.assert_frame_equal(rowsBetween(ranged, start, end), rowsBetween(lines, start, end))
+
+
+def test_append_mid_segment(tmp_path, lines):
+    path = str(tmp_path / 'raw.lecsz')
+    split = next(i for i in range(len(lines) // 2, len(lines)) if 'D:' in lines[i] and 'S:' in lines[i - 3])
+    writeArchive(lines[:split], path, blockLines=4096)
+    writeArchive(lines[split:], path, blockLines=4096)
+    assert list(iterArchive(path)) == lines
+    assertCutAtSlines(path)
+
+    boundary = pd.Timestamp('2023-06-01 01:00:00') + pd.Timedelta(seconds=split / 18)
+    start, end = boundary - pd.Timedelta('2min'), boundary + pd.Timedelta('30s')
+    pd.testing.assert_frame_equal(rowsBetween(readArchive(path, start, end), start, end), rowsBetween(lines, start, end))
@@ -0,0 +1,42 @@
+import os
+import sys
+import subprocess
+
+import numpy as np
+import pandas as pd
+
+from LECS_tools.calibrations import convert_raw_o2, polyval_into, do_cal_coeffs
+
+
+def referenceO2(voltO2, temp, c=do_cal_coeffs):
+    s = 1 + c['D_o2'] * (temp - 25)
+    pPrime = c['A_o2'] / s + c['B_o2'] / ((voltO2 - c['F_o2']) * s + c['C_o2'] + c['F_o2'])
+    return c['G_o2'] + c['H_o2'] * pPrime
+
+
+def test_convert_raw_o2_matches_the_formula():
+    volt = np.linspace(1.0, 3.0, 1001)
+    temp = np.linspace(5.0, 25.0, 1001)
+    np.testing.assert_allclose(convert_raw_o2(volt, temp, chunkSize=100), referenceO2(volt, temp))
+
+
+def test_convert_raw_o2_scalars_and_broadcasting():
+    assert np.ndim(convert_raw_o2(1.5, 12.0)) == 0
+    np.testing.assert_allclose(convert_raw_o2(1.5, 12.0), referenceO2(1.5, 12.0))
+    temp = np.array([10.0, 12.0, 14.0])
+    np.testing.assert_allclose(convert_raw_o2(1.5, temp), referenceO2(1.5, temp))
+    out = convert_raw_o2(pd.Series([1.5, 1.6], index=[3, 4]), 12.0)
+    assert list(out.index) == [3, 4]
+
+
+def test_polyval_into_in_place():
+    x = np.linspace(0, 1, 10)
+    expected = 1 + 2 * x + 3 * x**2
+    polyval_into(x, [1, 2, 3], out=x, chunkSize=3)
+    np.testing.assert_allclose(x, expected)
+
+
+def test_parser_import_does_not_need_sklearn():
+    code = 'import sys, LECS_tools._internalParserFuncsV2; assert "sklearn" not in sys.modules'
+    subprocess.run([sys.executable, '-c', code], check=True,
+                   cwd=os.path.join(os.path.dirname(__file__), '..', 'src'))
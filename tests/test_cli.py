@@ -0,0 +1,65 @@
+import os
+
+import xarray as xr
+
+from LECS_tools.cli import runBatch, loadManifest, main, MANIFEST_NAME
+from LECS_tools.synthetic import writeRawFile
+
+SETTINGS = {'alignMethod': 'clock'}
+
+
+def test_unchanged_files_are_skipped(tmp_path):
+    raw, out = tmp_path / 'raw', tmp_path / 'out'
+    raw.mkdir()
+    writeRawFile(str(raw / 'a.txt'), durationSeconds=600, seed=1, gpsIntervalSeconds=None)
+
+    first = runBatch(str(raw), str(out), workers=1, settings=SETTINGS)
+    assert first['processed'] == ['a.txt']
+    second = runBatch(str(raw), str(out), workers=1, settings=SETTINGS)
+    assert second['processed'] == [] and second['skipped'] == ['a.txt']
+
+    os.utime(raw / 'a.txt') # touched, same content
+    assert runBatch(str(raw), str(out), workers=1, settings=SETTINGS)['skipped'] == ['a.txt']
+
+
+def test_short_record_without_fluxes_is_not_reprocessed(tmp_path):
+    raw, out = tmp_path / 'raw', tmp_path / 'out'
+    raw.mkdir()
+    writeRawFile(str(raw / 'a.txt'), durationSeconds=2100, seed=1, gpsIntervalSeconds=None)
+    runBatch(str(raw), str(out), workers=1, settings=SETTINGS)
+    entry = loadManifest(str(out / MANIFEST_NAME))['files']['a.txt']
+    assert entry['fluxes'] == 1 and os.path.exists(entry['outputs']['flux'])
+
+    # replaced by a record too short for a flux window: the old flux store goes away
+    writeRawFile(str(raw / 'a.txt'), durationSeconds=600, seed=2, gpsIntervalSeconds=None)
+    assert runBatch(str(raw), str(out), workers=1, settings=SETTINGS)['processed'] == ['a.txt']
+    entry = loadManifest(str(out / MANIFEST_NAME))['files']['a.txt']
+    assert entry['fluxes'] == 0 and 'flux' not in entry['outputs']
+    assert not os.path.exists(out / 'a.txt_flux.nc')
+
+    assert runBatch(str(raw), str(out), workers=1, settings=SETTINGS)['skipped'] == ['a.txt']
+
+
+def test_same_stem_files_get_their_own_stores(tmp_path):
+    raw, out = tmp_path / 'raw', tmp_path / 'out'
+    raw.mkdir()
+    writeRawFile(str(raw / 'a.txt'), durationSeconds=300, seed=1, gpsIntervalSeconds=None)
+    writeRawFile(str(raw / 'a.log'), durationSeconds=600, seed=2, gpsIntervalSeconds=None)
+    assert sorted(runBatch(str(raw), str(out), workers=2)['processed']) == ['a.log', 'a.txt']
+
+    files = loadManifest(str(out / MANIFEST_NAME))['files']
+    assert files['a.txt']['outputs']['data'] != files['a.log']['outputs']['data']
+    assert files['a.txt']['settings']['lowMemory']
+    for name in ('a.txt', 'a.log'):
+        with xr.open_dataset(files[name]['outputs']['data']) as ds:
+            assert ds.sizes['time'] == files[name]['samples']
+
+
+def test_low_memory_flag(tmp_path):
+    raw, out = tmp_path / 'raw', tmp_path / 'out'
+    raw.mkdir()
+    writeRawFile(str(raw / 'a.txt'), durationSeconds=120, seed=1, gpsIntervalSeconds=None)
+    assert main([str(raw), str(out), '--workers', '1']) == 0
+    assert loadManifest(str(out / MANIFEST_NAME))['files']['a.txt']['settings']['lowMemory']
+    assert main([str(raw), str(out), '--workers', '1', '--no-low-memory']) == 0 # settings changed, reprocessed
+    assert not loadManifest(str(out / MANIFEST_NAME))['files']['a.txt']['settings']['lowMemory']
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from LECS_tools._internalParserFuncsV2 import parseDatabaseLines
+from truth import streamWithTruth, timeErrors
+
+
+def clockParse(lines):
+    parsed, _ = parseDatabaseLines(lines, alignMethod='clock')
+    return parsed
+
+
+def test_clean_stream_is_exact():
+    lines, truth = streamWithTruth(1200, seed=3)
+    parsed = clockParse(lines)
+    assert len(parsed) == len(truth)
+    assert np.abs(timeErrors(parsed, lines, truth)).max() < 1 / 16
+    assert parsed['droppedBefore'].sum() == 0
+
+
+@pytest.mark.parametrize('driftPPM', [-200, 200])
+def test_drift_drops_and_corruption(driftPPM):
+    lines, truth = streamWithTruth(3600, driftPPM=driftPPM, seed=4, dropFraction=0.01,
+                                   corruptFraction=0.002, junkFraction=0.001)
+    parsed = clockParse(lines)
+    err = timeErrors(parsed, lines, truth)
+    assert np.nanmax(np.abs(err)) < 1 / 16 + 0.08 # a sample plus the bias of one second resolution anchors
+    assert np.all(np.diff(parsed['time'].to_numpy()) > np.timedelta64(0))
+
+
+def test_gap_over_several_counter_turns():
+    lines, truth = streamWithTruth(1200, seed=5)
+    t = [truth.get(l.rstrip('.')) for l in lines]
+    cut = [l for l, ti in zip(lines, t)
+           if ti is None or not pd.Timestamp('2023-06-01 00:10:00') <= ti < pd.Timestamp('2023-06-01 00:10:30')]
+    parsed = clockParse(cut)
+    assert np.abs(timeErrors(parsed, cut, truth)).max() < 1 / 16
+    assert parsed['droppedBefore'].max() == 30 * 16
+
+
+def test_counter_reset_across_logging_gap():
+    a, truthA = streamWithTruth(1800, seed=1, countStart=0)
+    b, truthB = streamWithTruth(1800, start='2023-06-01 00:40:00', seed=2, countStart=77)
+    lines = a + b
+    parsed = clockParse(lines)
+    err = timeErrors(parsed, lines, {**truthA, **truthB})
+    assert np.abs(err).max() < 1 / 16
+    assert parsed['droppedBefore'].max() == 10 * 60 * 16 # the ten minute gap, nothing phantom
+    assert parsed['droppedBefore'].sum() == 10 * 60 * 16
+
+
+def test_no_row_after_any_sline():
+    lines, _ = streamWithTruth(60, seed=4)
+    dlines = [l for l in lines if 'D:' in l]
+    sline = next(l for l in lines if 'S:' in l)
+    parsed = clockParse(dlines + [sline])
+    assert len(parsed) == 0
+    assert len(parseDatabaseLines(dlines + [sline], lowMemory=True)[0]) == 0
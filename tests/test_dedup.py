@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+
+from LECS_tools._internalParserFuncsV2 import parseDatabaseLines
+from LECS_tools.dedup import LineFingerprints, dropSeenRows
+from LECS_tools.synthetic import generateRawLines
+
+
+def process(seen, lines):
+    kept, isNew = seen.filterNew(lines)
+    parsed, _ = parseDatabaseLines(kept, lowMemory=True)
+    seen.commit()
+    return dropSeenRows(parsed, isNew)
+
+
+def test_overlapping_downloads_give_each_sample_once(tmp_path):
+    lines = list(generateRawLines(1800, seed=8, gpsIntervalSeconds=None))
+    path = str(tmp_path / 'fp.npy')
+    first = process(LineFingerprints(path), lines[:12000])
+    second = process(LineFingerprints(path), lines[:20000]) # the second download repeats the first
+    whole, _ = parseDatabaseLines(lines[:20000], lowMemory=True)
+    combined = pd.concat([first, second])[['time', 'count', 'u', 'w']]
+    assert not combined.duplicated().any()
+    assert len(combined) >= len(whole) - 16 * 2 # up to the open segment at the end
+
+
+def test_horizon_prunes_old_fingerprints(tmp_path):
+    lines = list(generateRawLines(3 * 3600, seed=9, gpsIntervalSeconds=None))
+    seen = LineFingerprints(str(tmp_path / 'fp.npy'), horizon='1h')
+    for chunk in np.array_split(np.arange(len(lines)), 6):
+        process(seen, [lines[i] for i in chunk])
+    assert len(seen) < 1.1 * 3600 * 17 # about an hour of D and S lines
+    reloaded = LineFingerprints(str(tmp_path / 'fp.npy'), horizon='1h')
+    assert len(reloaded) == len(seen)
+    _, isNew = reloaded.filterNew(lines[:20000]) # older than the horizon: taken as processed
+    assert not isNew.any()
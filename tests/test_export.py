@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+import xarray as xr
+
+from LECS_tools._internalParserFuncsV2 import parseDatabaseLines
+from LECS_tools.export import exportData
+from LECS_tools.synthetic import generateRawLines
+
+
+@pytest.mark.parametrize('name', ['aligned.zarr', 'aligned.nc'])
+def test_append_round_trip(tmp_path, name):
+    path = str(tmp_path / name)
+    lines = list(generateRawLines(600, start='2023-06-01 00:00:00', seed=3, gpsIntervalSeconds=None))
+    data, _ = parseDatabaseLines(lines, lowMemory=True)
+    data = data.sort_values('time')
+    half = len(data) // 2
+
+    assert exportData(data.iloc[:half], path, variables=['u', 'w', 'temp'], chunkSize=1000) == half
+    assert exportData(data.iloc[half - 100:], path, variables=['u', 'w', 'temp'], chunkSize=1000) == len(data) - half
+
+    with (xr.open_zarr(path) if name.endswith('.zarr') else xr.open_dataset(path)) as ds:
+        assert ds.sizes['time'] == len(data)
+        np.testing.assert_array_equal(ds['time'].values, data['time'].to_numpy(dtype='datetime64[ns]'))
+        np.testing.assert_allclose(ds['w'].values, data['w'].to_numpy(dtype=float))
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from LECS_tools._internalParserFuncsV2 import parseDatabaseLines
+from LECS_tools.flux import spectralECflux, integrateCospectra
+from LECS_tools.fluxcache import FluxCache
+from LECS_tools.synthetic import generateRawLines
+
+
+@pytest.fixture(scope='module')
+def parsed():
+    lines = list(generateRawLines(3 * 3600, seed=2, dropFraction=0.01, gpsIntervalSeconds=None))
+    return parseDatabaseLines(lines, alignMethod='clock')[0]
+
+
+def test_default_bins_are_filled_and_reproduce_the_flux(parsed):
+    flux, _, cospectra = spectralECflux(parsed, 'w', 'temp', returnCospectra=True)
+    assert not np.isnan(cospectra['cospectrum']).any() # no empty bins
+    assert cospectra['f_high'].values[-1] == 8.0 # up to Nyquist
+    np.testing.assert_allclose(integrateCospectra(cospectra).values, flux, rtol=1e-10)
+
+
+def test_bands_on_bin_edges_reproduce_the_flux(parsed):
+    _, _, cospectra = spectralECflux(parsed, 'w', 'temp', returnCospectra=True)
+    edges = cospectra['edge'].values
+    for low, high in ((edges[3], edges[20]), (edges[0], edges[-1]), (edges[10], edges[30])):
+        flux, _ = spectralECflux(parsed, 'w', 'temp', low=low, high=high)
+        np.testing.assert_allclose(integrateCospectra(cospectra, low, high).values, flux, rtol=1e-10)
+
+
+def test_cached_cospectra_match(parsed):
+    cache = FluxCache()
+    first = spectralECflux(parsed, 'w', 'temp', returnCospectra=True, cache=cache)
+    second = spectralECflux(parsed, 'w', 'temp', returnCospectra=True, cache=cache)
+    assert cache.hits == len(first[0])
+    np.testing.assert_array_equal(first[0], second[0])
+    np.testing.assert_array_equal(first[2]['cumulativeBelow'].values, second[2]['cumulativeBelow'].values)
+
+
+def test_growing_record_only_recomputes_new_windows(parsed):
+    cache = FluxCache()
+    prefix = parsed[parsed['time'] < np.datetime64('2023-06-01T02:40')]
+    first = spectralECflux(prefix, 'w', 'temp', returnCospectra=True, cache=cache)
+    assert len(first[0]) == 3 and cache.misses == 3
+
+    misses = cache.misses
+    grown = spectralECflux(parsed, 'w', 'temp', returnCospectra=True, cache=cache)
+    assert cache.misses - misses == 1 # only the last, extended window
+    assert cache.hits == 2
+    uncached = spectralECflux(parsed, 'w', 'temp', returnCospectra=True)
+    np.testing.assert_array_equal(grown[0], uncached[0])
+    np.testing.assert_array_equal(grown[1], uncached[1])
+    np.testing.assert_array_equal(grown[2]['cumulativeBelow'].values, uncached[2]['cumulativeBelow'].values)
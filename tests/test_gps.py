@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+
+from LECS_tools._internalParserFuncsV2 import GPSlineParser, mergeGPS, parseDatabaseLines
+from LECS_tools.synthetic import gpsLine, generateRawLines
+
+
+def test_gga_before_first_rmc_takes_the_next_rmc_date():
+    gps = GPSlineParser([(0, gpsLine('2023-06-01 00:00:05', sentence='GPGGA')),
+                         (1, gpsLine('2023-06-01 00:00:06'))])
+    assert list(gps['time']) == [pd.Timestamp('2023-06-01 00:00:05'), pd.Timestamp('2023-06-01 00:00:06')]
+
+
+def test_gga_before_first_rmc_across_midnight():
+    gps = GPSlineParser([(0, gpsLine('2023-05-31 23:59:59', sentence='GPGGA')),
+                         (1, gpsLine('2023-06-01 00:00:01'))])
+    assert gps['time'].iloc[0] == pd.Timestamp('2023-05-31 23:59:59')
+
+
+def test_gga_after_rmc_across_midnight():
+    gps = GPSlineParser([(0, gpsLine('2023-05-31 23:59:59')),
+                         (1, gpsLine('2023-06-01 00:00:01', sentence='GPGGA'))])
+    assert gps['time'].iloc[1] == pd.Timestamp('2023-06-01 00:00:01')
+
+
+def test_bad_checksums_dropped_and_positions_decoded():
+    gps = GPSlineParser([(0, gpsLine('2023-06-01 00:00:00', lat=41.5, lon=-70.25)),
+                         (1, gpsLine('2023-06-01 00:00:01', badChecksum=True))])
+    assert len(gps) == 1
+    assert np.isclose(gps['lat'].iloc[0], 41.5) and np.isclose(gps['lon'].iloc[0], -70.25)
+
+
+def test_merge_gps_onto_data():
+    gps = GPSlineParser([(i, gpsLine(pd.Timestamp('2023-06-01') + pd.Timedelta(seconds=i), lat=41 + i / 100))
+                         for i in range(5)])
+    data = pd.DataFrame({'time': pd.date_range('2023-06-01', periods=5 * 16, freq='62500us'), 'w': 0.0})
+    merged = mergeGPS(data, gps)
+    assert merged['lat'].notna().all()
+    assert np.isclose(merged['lat'].iloc[0], 41.0)
+
+
+def test_dtypes_do_not_depend_on_gps_lines():
+    withGPS = list(generateRawLines(60, seed=9))
+    noGPS = [l for l in withGPS if '$' not in l]
+    assert GPSlineParser([]).dtypes.equals(GPSlineParser([(i, l) for i, l in enumerate(withGPS) if '$' in l]).dtypes)
+    parsedWith, _ = parseDatabaseLines(withGPS, parseGPS=True)
+    parsedWithout, _ = parseDatabaseLines(noGPS, parseGPS=True)
+    assert parsedWith.dtypes.equals(parsedWithout.dtypes)
+    assert parsedWithout['lat'].dtype == np.float64 and parsedWithout['lat'].isna().all()
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+
+from LECS_tools._internalParserFuncsV2 import SlineParser
+from LECS_tools.health import HealthMonitor, tiltAngle
+from LECS_tools.synthetic import slineText
+
+
+def telemetry(hours, battery, pitch, start='2023-06-01'):
+    times = pd.date_range(start, periods=hours * 60, freq='1min')
+    frac = np.linspace(0, 1, len(times))
+    lines = [(i, slineText(t, t, batteryVoltage=battery(f), pitch=pitch(f))) for i, (t, f) in enumerate(zip(times, frac))]
+    return SlineParser(lines, timeOnly=False)
+
+
+def test_tilt_angle():
+    np.testing.assert_allclose(tiltAngle([0, 10, 0], [0, 0, 10]), [0, 10, 10], atol=1e-9)
+
+
+def test_steady_instrument_has_no_alerts():
+    monitor = HealthMonitor()
+    assert monitor.update(telemetry(24, lambda f: 12.5, lambda f: 1.0)) == []
+    assert monitor.flush() == []
+    assert len(monitor.summary()) == 24
+
+
+def test_battery_and_tilt_alerts_once_per_hour(tmp_path):
+    monitor = HealthMonitor(baselineHours=3)
+    sLines = telemetry(24, lambda f: 12.5 - 2.0 * f, lambda f: 1.0 if f < 0.5 else 8.0)
+    alerts = []
+    for batch in np.array_split(np.arange(len(sLines)), 10): # batches split hours
+        alerts += monitor.update(sLines.iloc[batch])
+    alerts += monitor.flush()
+    kinds = pd.DataFrame(alerts).groupby('kind')['time']
+    assert kinds.nunique()['tilt'] == kinds.count()['tilt'] # no hour alerted twice
+    assert kinds.min()['tilt'] == pd.Timestamp('2023-06-01 12:00')
+    assert 'battery' in kinds.groups
+
+    monitor.save(str(tmp_path / 'health.pkl'))
+    loaded = HealthMonitor.load(str(tmp_path / 'health.pkl'))
+    pd.testing.assert_frame_equal(loaded.summary(), monitor.summary())
+
+
+def test_corrupted_clock_fields_become_missing():
+    good = slineText('2023-06-01 00:00:01', '2023-06-01 00:00:01')
+    fields = good.split(',')
+    fields[1] = '99999' # system clock minute
+    fields[7] = '1e6' # ADV clock second
+    sLines = SlineParser([(0, good), (1, ','.join(fields))], timeOnly=False)
+    assert len(sLines) == 2
+    assert sLines['minute'].isna().tolist() == [False, True]
+    assert sLines['secondVSD'].isna().tolist() == [False, True]
+    assert sLines['batteryVoltage'].notna().all()
+    assert HealthMonitor().update(sLines) == []
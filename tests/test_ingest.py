@@ -0,0 +1,137 @@
+import asyncio
+
+import numpy as np
+import xarray as xr
+
+from LECS_tools._internalParserFuncsV2 import parseDatabaseLines
+from LECS_tools.ingest import parseQueue, exportSink, sourceStorePath, tailFile, readSocket, runIngest
+from LECS_tools.metrics import PipelineMetrics
+from LECS_tools.synthetic import generateRawLines
+
+
+def feed(lines, sink, source):
+    async def run():
+        queue = asyncio.Queue()
+        for line in lines + [None]:
+            queue.put_nowait(line)
+        await parseQueue(queue, sink, source, batchLines=500)
+    asyncio.run(run())
+
+
+def test_lagging_source_is_not_dropped(tmp_path):
+    store = str(tmp_path / 'live.zarr')
+    sink = exportSink(store)
+    ahead = list(generateRawLines(300, start='2023-06-01 01:00:00', seed=1, gpsIntervalSeconds=None))
+    behind = list(generateRawLines(300, start='2023-06-01 00:00:00', seed=2, gpsIntervalSeconds=None))
+    feed(ahead, sink, 'tcp://127.0.0.1:5000')
+    feed(behind, sink, '/data/raw.log')
+
+    for lines, source in ((ahead, 'tcp://127.0.0.1:5000'), (behind, '/data/raw.log')):
+        expected, _ = parseDatabaseLines(lines, lowMemory=True)
+        with xr.open_zarr(sourceStorePath(store, source)) as ds:
+            assert ds.sizes['time'] == len(expected)
+
+
+def test_restart_does_not_duplicate(tmp_path):
+    store = str(tmp_path / 'live.nc')
+    lines = list(generateRawLines(300, seed=3, gpsIntervalSeconds=None))
+    feed(lines[:3000], exportSink(store), 'a')
+    feed(lines, exportSink(store), 'a') # restarted service reads the file from the start
+    expected, _ = parseDatabaseLines(lines, lowMemory=True)
+    with xr.open_dataset(sourceStorePath(store, 'a')) as ds:
+        stored = ds[['u', 'w']].to_dataframe().reset_index()
+    assert not stored.duplicated().any()
+    # only the samples of the cut whose (legacy) times overlap the stored ones are skipped
+    assert len(expected) - 10 * 16 < len(stored) <= len(expected)
+
+
+def test_store_times_only_grow(tmp_path):
+    store = str(tmp_path / 'live.nc')
+    lines = list(generateRawLines(600, start='2023-06-01 00:00:00', dropFraction=0.01, seed=5))
+    feed(lines, exportSink(store), 'a')
+    expected, _ = parseDatabaseLines(lines)
+    expected = expected.sort_index(kind='stable').sort_values(by='time', kind='stable')
+    with xr.open_dataset(sourceStorePath(store, 'a')) as ds:
+        assert (np.diff(ds['time'].values) >= np.timedelta64(0)).all()
+        assert ds.sel(time=slice('2023-06-01 00:01', '2023-06-01 00:02')).sizes['time'] > 0
+        np.testing.assert_array_equal(ds['time'].values, expected['time'].to_numpy(dtype='datetime64[ns]'))
+
+
+def test_tail_file_follows_appends_and_truncation(tmp_path):
+    path = tmp_path / 'raw.log'
+    path.write_text('a\nb\n')
+
+    async def run():
+        queue = asyncio.Queue()
+        stop = asyncio.Event()
+        task = asyncio.create_task(tailFile(str(path), queue, pollInterval=0.01, stopEvent=stop))
+
+        async def take(n):
+            return [await asyncio.wait_for(queue.get(), 5) for _ in range(n)]
+
+        assert await take(2) == ['a', 'b']
+        with open(path, 'a') as fid:
+            fid.write('c\r\npart')
+        assert await take(1) == ['c']
+        with open(path, 'a') as fid:
+            fid.write('ial\n')
+        assert await take(1) == ['partial'] # held until its newline arrives
+        await asyncio.sleep(0.05)
+        path.write_text('x\n') # truncated, read again from the start
+        assert await take(1) == ['x']
+        stop.set()
+        await asyncio.wait_for(task, 5)
+        assert queue.empty()
+    asyncio.run(run())
+
+
+def test_read_socket(tmp_path):
+    lines = list(generateRawLines(60, seed=4, gpsIntervalSeconds=None))
+
+    async def serve(reader, writer):
+        writer.write(''.join(line + '\r\n' for line in lines).encode())
+        await writer.drain()
+        writer.close()
+
+    async def run():
+        server = await asyncio.start_server(serve, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        queue = asyncio.Queue()
+        async with server:
+            await asyncio.wait_for(readSocket('127.0.0.1', port, queue), 5)
+        return [queue.get_nowait() for _ in range(queue.qsize())]
+    assert asyncio.run(run()) == lines
+
+
+def test_file_and_socket_sources_share_metrics(tmp_path):
+    fileLines = list(generateRawLines(120, seed=6, gpsIntervalSeconds=None))
+    socketLines = list(generateRawLines(120, seed=7, gpsIntervalSeconds=None))
+    path = tmp_path / 'raw.log'
+    path.write_text(''.join(line + '\n' for line in fileLines))
+    published = {}
+
+    def sink(parsed, sDataFrame, source):
+        published[source] = published.get(source, 0) + len(parsed)
+
+    async def serve(reader, writer):
+        writer.write(''.join(line + '\n' for line in socketLines).encode())
+        await writer.drain()
+        writer.close()
+
+    async def run():
+        server = await asyncio.start_server(serve, '127.0.0.1', 0)
+        source = 'tcp://127.0.0.1:%d' % server.sockets[0].getsockname()[1]
+        stop = asyncio.Event()
+        async with server:
+            task = asyncio.create_task(runIngest([str(path), source], sink, batchLines=100, pollInterval=0.01,
+                                                 stopEvent=stop, metrics=metrics))
+            await asyncio.sleep(2)
+            stop.set()
+            await asyncio.wait_for(task, 10)
+        return source
+
+    metrics = PipelineMetrics()
+    source = asyncio.run(run())
+    assert published[str(path)] == len(parseDatabaseLines(fileLines)[0])
+    assert published[source] == len(parseDatabaseLines(socketLines)[0])
+    assert len(metrics.stages) % 5 == 0 and all(stage.seconds is not None for stage in metrics.stages)
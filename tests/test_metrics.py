@@ -0,0 +1,48 @@
+from LECS_tools._internalParserFuncsV2 import parseDatabaseLines
+from LECS_tools.metrics import PipelineMetrics
+from LECS_tools.synthetic import generateRawLines
+
+
+def lineKinds(lines):
+    kinds = {'D': 0, 'S': 0, '$': 0, 'other': 0}
+    for l in lines:
+        kind = 'D' if 'D:' in l else 'S' if 'S:' in l else '$' if '$' in l else 'other'
+        kinds[kind] += 1
+    return kinds
+
+
+def test_stage_counts_and_drop_reasons():
+    lines = list(generateRawLines(300, junkFraction=0.05, corruptFraction=0.02, seed=11))
+    kinds = lineKinds(lines)
+    assert min(kinds.values()) > 0
+
+    metrics = PipelineMetrics()
+    parsed, sLines = parseDatabaseLines(lines, metrics=metrics, parseGPS=True)
+    assert [stage.name for stage in metrics.stages] == ['classify', 'D-parse', 'S-parse', 'align', 'filter', 'gps-parse']
+
+    classify = metrics['classify']
+    assert classify.rowsIn == len(lines)
+    assert classify.rowsOut == kinds['D'] + kinds['S'] + kinds['$']
+    assert classify.dropped == {'unclassified line': kinds['other']}
+
+    dParse = metrics['D-parse']
+    assert dParse.rowsIn == kinds['D']
+    assert 0 < dParse.dropped['wrong number of fields or not a number'] == kinds['D'] - dParse.rowsOut
+    assert metrics['S-parse'].rowsIn == kinds['S'] and metrics['S-parse'].rowsOut == kinds['S']
+    assert metrics['align'].rowsIn == dParse.rowsOut
+    assert metrics['filter'].rowsOut == len(parsed)
+    assert metrics['filter'].rowsIn - len(parsed) == sum(metrics['filter'].dropped.values())
+
+    gps = metrics['gps-parse']
+    assert gps.rowsIn == kinds['$']
+    assert 0 < gps.dropped['bad checksum or unsupported sentence'] == kinds['$'] - gps.rowsOut
+    assert len(metrics.summary()) == 6
+
+
+def test_generator_input():
+    lines = list(generateRawLines(60, junkFraction=0.05, seed=12))
+    metrics = PipelineMetrics()
+    parsed, _ = parseDatabaseLines(iter(lines), metrics=metrics)
+    assert len(parsed) == len(parseDatabaseLines(lines)[0])
+    assert metrics['classify'].rowsIn == len(lines)
+    assert metrics['classify'].dropped['gps line (not parsed)'] == lineKinds(lines)['$']
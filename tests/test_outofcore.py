@@ -0,0 +1,29 @@
+import numpy as np
+import pandas as pd
+
+from LECS_tools._internalParserFuncsV2 import DlineParser, parseDatabaseLines
+from LECS_tools.flux import spectralECflux
+from LECS_tools.outofcore import processOutOfCore
+from LECS_tools.synthetic import generateRawLines
+
+GOOD = '12,1000,10,-20,30,100,100,100,90,90,90,0,0,1.2000,0.8000,2.1000'
+
+
+def test_dline_parser_drops_lines_that_are_not_numbers():
+    lines = [(0, 'D:' + GOOD), (1, 'D:' + GOOD[:-6] + ','), (2, 'D:' + GOOD.replace('1000', 'x1')),
+             (3, 'D:' + GOOD + '.')]
+    parsed = DlineParser(lines, chunkSize=2)
+    assert list(parsed.index) == [0, 3]
+    np.testing.assert_allclose(parsed.iloc[0].to_numpy(), parsed.iloc[1].to_numpy())
+    assert all(parsed[name].to_numpy().flags['C_CONTIGUOUS'] for name in parsed.columns)
+
+
+def test_out_of_core_matches_in_memory():
+    lines = list(generateRawLines(3 * 3600, seed=7, dropFraction=0.002, corruptFraction=0.002, junkFraction=0.001,
+                                  gpsIntervalSeconds=None))
+    parsed, _ = parseDatabaseLines(lines, lowMemory=True)
+    flux, times = spectralECflux(parsed, 'w', 'temp')
+    fluxOoc, timesOoc = processOutOfCore(iter(lines), chunkLines=20000)
+    assert len(times) == 3
+    np.testing.assert_array_equal(pd.DatetimeIndex(timesOoc), pd.DatetimeIndex(times))
+    np.testing.assert_allclose(fluxOoc, flux, rtol=1e-9)
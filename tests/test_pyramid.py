@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+
+from LECS_tools._internalParserFuncsV2 import parseDatabaseLines
+from LECS_tools.pyramid import Pyramid
+from LECS_tools.synthetic import generateRawLines
+
+VARIABLES = ['u', 'w', 'temp']
+
+
+def test_incremental_updates_match_one_update(tmp_path):
+    lines = list(generateRawLines(2 * 3600, seed=6, dropFraction=0.01, gpsIntervalSeconds=None))
+    parsed, _ = parseDatabaseLines(lines, alignMethod='clock')
+    whole = Pyramid(VARIABLES).update(parsed)
+    parts = Pyramid(VARIABLES)
+    parts.offset = whole.offset
+    for chunk in np.array_split(np.arange(len(parsed)), 37): # cuts fall inside bins
+        parts.update(parsed.iloc[chunk])
+    for level in whole.levels:
+        assert len(parts.blocks[level]) <= 8
+        pd.testing.assert_frame_equal(parts.stats(level), whole.stats(level), rtol=1e-9)
+
+    parts.save(str(tmp_path / 'pyr.pkl'))
+    loaded = Pyramid.load(str(tmp_path / 'pyr.pkl'))
+    pd.testing.assert_frame_equal(loaded.query(maxPoints=200), whole.query(maxPoints=200), rtol=1e-9)
+
+
+def test_stats_match_pandas_resample():
+    lines = list(generateRawLines(1800, seed=7, gpsIntervalSeconds=None))
+    parsed, _ = parseDatabaseLines(lines, alignMethod='clock')
+    stats = Pyramid(VARIABLES).update(parsed).stats('1min')
+    resampled = parsed.set_index('time')['w'].resample('1min')
+    np.testing.assert_allclose(stats[('w', 'mean')].to_numpy(), resampled.mean().to_numpy(), rtol=1e-9)
+    np.testing.assert_allclose(stats[('w', 'std')].to_numpy(), resampled.std().to_numpy(), rtol=1e-6)
+    np.testing.assert_array_equal(stats[('w', 'max')].to_numpy(), resampled.max().to_numpy())
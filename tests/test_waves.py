@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from LECS_tools._internalParserFuncsV2 import parseDatabaseLines
+from LECS_tools.synthetic import generateRawLines
+from LECS_tools.waves import waveStatistics, waveDominated, waveNumber
+
+
+@pytest.fixture(scope='module')
+def parsed():
+    lines = list(generateRawLines(3 * 3600, seed=10, dropFraction=0.001, gpsIntervalSeconds=None))
+    return parseDatabaseLines(lines, alignMethod='clock')[0]
+
+
+def test_dispersion_relation_limits():
+    depth = np.array([1000.0, 0.5])
+    omega = 2 * np.pi / 8.0
+    k = waveNumber(omega, depth)
+    np.testing.assert_allclose(k[0], omega**2 / 9.81, rtol=1e-6) # deep water
+    np.testing.assert_allclose(k[1], omega / np.sqrt(9.81 * 0.5), rtol=0.02) # shallow water
+
+
+def test_synthetic_swell_is_found(parsed):
+    stats = waveStatistics(parsed)
+    assert len(stats) == 3
+    np.testing.assert_allclose(stats['Tp'], 8.0, rtol=0.03) # the 8 s swell of the generator
+    np.testing.assert_allclose(stats['depth'], 10.0, atol=1.0)
+    assert (stats['velocityWaveFraction'] > 0.5).all()
+    assert waveDominated(stats).all()
+
+
+def test_batches_do_not_change_the_result(parsed):
+    stats = waveStatistics(parsed)
+    np.testing.assert_allclose(waveStatistics(parsed, batchSegments=5).to_numpy(), stats.to_numpy(), rtol=1e-10)
+    np.testing.assert_allclose(waveStatistics(parsed, batchBytes=1).to_numpy(), stats.to_numpy(), rtol=1e-10)
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from LECS_tools.flux import spectralECflux, windowCovariance
+from LECS_tools.waves import waveStatistics
+from LECS_tools.windows import WindowIndex
+
+
+@pytest.fixture(scope='module')
+def frame():
+    rng = np.random.default_rng(0)
+    offsets = np.sort(rng.uniform(0, 5 * 3600, 20000)) # irregular, with a gap of empty windows
+    offsets = offsets[(offsets < 3600) | (offsets > 3 * 3600)]
+    time = pd.Timestamp('2023-06-01 00:37') + pd.to_timedelta(offsets, unit='s')
+    return pd.DataFrame({'time': time, 'x': rng.normal(size=len(time))})
+
+
+def test_bounds_match_grouper(frame):
+    for freq in ('60min', '20min', '7min'):
+        idx = WindowIndex(frame['time'], freq=freq)
+        sizes = frame.groupby(pd.Grouper(freq=freq, key='time')).size()
+        np.testing.assert_array_equal(idx.binStarts, sizes.index.to_numpy(dtype='datetime64[ns]'))
+        np.testing.assert_array_equal(idx.lengths, sizes.to_numpy())
+        assert idx.order is None
+        x = frame['x'].to_numpy()
+        k = np.flatnonzero(idx.lengths)[1]
+        assert np.shares_memory(idx.take(k, x), x) # sorted: views
+
+
+def test_unsorted_input_and_nat(frame):
+    sortedIdx = WindowIndex(frame['time'], freq='20min')
+    shuffled = frame.sample(frac=1, random_state=1).reset_index(drop=True)
+    shuffled.loc[::50, 'time'] = pd.NaT
+    idx = WindowIndex(shuffled['time'], freq='20min')
+    assert idx.order is not None and idx.n == len(shuffled)
+    assert idx.lengths.sum() == shuffled['time'].notna().sum()
+
+    valid = shuffled[shuffled['time'].notna()]
+    sizes = valid.groupby(pd.Grouper(freq='20min', key='time')).size()
+    np.testing.assert_array_equal(idx.lengths, sizes.to_numpy())
+    x = shuffled['x'].to_numpy()
+    for k in np.flatnonzero(idx.lengths):
+        t = idx.take(k, shuffled['time'].to_numpy())
+        assert (np.diff(t) >= np.timedelta64(0)).all() and not np.isnat(t).any()
+        window = valid[(valid['time'] >= idx.binStarts[k]) & (valid['time'] < idx.binStarts[k] + np.timedelta64(20, 'm'))]
+        np.testing.assert_array_equal(np.sort(idx.take(k, x)), np.sort(window['x'].to_numpy()))
+    assert len(sortedIdx) == len(idx)
+
+
+def test_stale_index_is_rejected(frame):
+    df = frame.assign(w=frame['x'], temp=frame['x'], pressure=frame['x'], u=frame['x'], v=frame['x'])
+    stale = WindowIndex(df['time'].iloc[:-10])
+    for func in (lambda: spectralECflux(df, 'w', 'temp', windowIndex=stale),
+                 lambda: windowCovariance(df, 'w', 'temp', windowIndex=stale),
+                 lambda: waveStatistics(df, windowIndex=stale)):
+        with pytest.raises(ValueError):
+            func()
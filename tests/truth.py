@@ -0,0 +1,40 @@
+"""
+Synthetic streams with the true time of every sample (ground truth for the time alignment tests).
+
+generateRawLines draws all the signals of a chunk up front, so with one chunk the same seed gives the same
+D line text with or without drops and corruption; the clean stream tells the sample number of every line.
+"""
+
+import numpy as np
+import pandas as pd
+
+from LECS_tools.synthetic import generateRawLines
+
+
+def streamWithTruth(durationSeconds, start='2023-06-01 00:00:00', driftPPM=0.0, seed=0, **kwargs):
+    """
+    raw lines of a synthetic stream and a dict of the true time of each D line (keyed by the stripped text)
+    """
+    gen = dict(durationSeconds=durationSeconds, start=start, driftPPM=driftPPM, seed=seed,
+               chunkSeconds=durationSeconds, gpsIntervalSeconds=None)
+    lines = list(generateRawLines(**gen, **kwargs))
+    clean = dict(kwargs, dropFraction=0.0, corruptFraction=0.0, junkFraction=0.0)
+    dtSample = (1 + driftPPM * 1e-6) / 16
+    t0 = pd.Timestamp(start)
+    truth = {}
+    k = 0
+    for line in generateRawLines(**gen, **clean):
+        if line.startswith('D:'):
+            truth[line.rstrip('.')] = t0 + pd.Timedelta(seconds=k * dtSample)
+            k += 1
+    return lines, truth
+
+
+def timeErrors(parsed, lines, truth):
+    """
+    parsed time minus true time in seconds for every row of parseDatabaseLines output
+    (NaN for truncated lines that still parsed, they have no clean counterpart)
+    """
+    true = np.array([truth.get(lines[i].strip().rstrip('.'), np.datetime64('NaT')) for i in parsed.index],
+                    dtype='datetime64[ns]')
+    return (parsed['time'].to_numpy(dtype='datetime64[ns]') - true) / np.timedelta64(1, 's')